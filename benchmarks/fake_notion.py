@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+MAX_CHILDREN = 100
+MAX_PAYLOAD_BYTES = 500 * 1024
+MAX_TEXT_LENGTH = 2000
+
+
+class FakeNotionState:
+    """In-memory block tree plus the rate limiter shared by all handlers."""
+
+    def __init__(self, requests_per_second: float = 3, burst: int = 3):
+        self.lock = threading.Lock()
+        self.blocks: dict[str, dict] = {}
+        self.titles: dict[str, str] = {}
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.counts = {"requests": 0, "rate_limited": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated_at) * self.requests_per_second,
+            )
+            self.updated_at = now
+            self.counts["requests"] += 1
+            if self.tokens < 1:
+                self.counts["rate_limited"] += 1
+                return False
+            self.tokens -= 1
+            return True
+
+    def add_block(self, block: dict, parent_id: str) -> str:
+        block_id = str(uuid.uuid4())
+        block_type = block["type"]
+        children = block.get(block_type, {}).pop("children", [])
+        self.blocks[block_id] = {
+            "id": block_id,
+            "type": block_type,
+            "parent": parent_id,
+            "data": block.get(block_type, {}),
+            "children": [],
+        }
+        self.blocks[block_id]["children"] = [
+            self.add_block(child, block_id) for child in children
+        ]
+        return block_id
+
+    def view(self, block_id: str) -> dict:
+        block = self.blocks[block_id]
+        data = dict(block["data"])
+        if "rich_text" in data:
+            data["rich_text"] = [
+                {**part, "plain_text": part.get("text", {}).get("content", "")}
+                for part in data["rich_text"]
+            ]
+        return {
+            "object": "block",
+            "id": block_id,
+            "type": block["type"],
+            "has_children": bool(block["children"]),
+            block["type"]: data,
+        }
+
+
+def _validate_children(children: list) -> str | None:
+    if len(children) > MAX_CHILDREN:
+        return f"body.children.length should be ≤ {MAX_CHILDREN}"
+    for child in children:
+        data = child.get(child.get("type"), {})
+        for part in data.get("rich_text", []):
+            content = part.get("text", {}).get("content", "")
+            # Notion counts UTF-16 code units
+            if len(content.encode("utf-16-le")) // 2 > MAX_TEXT_LENGTH:
+                return f"rich_text content length should be ≤ {MAX_TEXT_LENGTH}"
+        error = _validate_children(data.get("children", []))
+        if error:
+            return error
+    return None
+
+
+def _handler(state: FakeNotionState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: dict, headers: dict | None = None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _body(self) -> dict | None:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b""
+            if length > MAX_PAYLOAD_BYTES:
+                self._reply(413, {"message": "Request body too large."})
+                state.counts["rejected"] += 1
+                return None
+            return json.loads(raw) if raw else {}
+
+        def _admit(self) -> bool:
+            if state.allow():
+                return True
+            self._reply(429, {"code": "rate_limited"}, {"Retry-After": "1"})
+            return False
+
+        def _parts(self) -> list[str]:
+            return urlparse(self.path).path.strip("/").split("/")[1:]
+
+        def _exists(self, block_id: str) -> bool:
+            with state.lock:
+                if block_id in state.blocks:
+                    return True
+            self._reply(404, {"code": "object_not_found", "message": block_id})
+            return False
+
+        def do_POST(self):
+            if not self._admit():
+                return
+            body = self._body()
+            if body is None:
+                return
+            parts = self._parts()
+            if parts[0] == "databases":
+                title = body["filter"]["title"]["equals"]
+                with state.lock:
+                    results = [
+                        {"object": "page", "id": page_id}
+                        for page_id, page_title in state.titles.items()
+                        if page_title == title
+                    ]
+                return self._reply(200, {"results": results, "has_more": False})
+            error = _validate_children(body.get("children", []))
+            if error:
+                state.counts["rejected"] += 1
+                return self._reply(400, {"code": "validation_error", "message": error})
+            with state.lock:
+                page_id = str(uuid.uuid4())
+                state.blocks[page_id] = {"id": page_id, "type": "page", "children": []}
+                state.blocks[page_id]["children"] = [
+                    state.add_block(child, page_id)
+                    for child in body.get("children", [])
+                ]
+                title = body["properties"]["notes"]["title"][0]["text"]["content"]
+                state.titles[page_id] = title
+            self._reply(200, {"object": "page", "id": page_id})
+
+        def do_GET(self):
+            if not self._admit():
+                return
+            block_id = self._parts()[1]
+            if not self._exists(block_id):
+                return
+            with state.lock:
+                results = [
+                    state.view(child) for child in state.blocks[block_id]["children"]
+                ]
+            self._reply(
+                200, {"results": results, "has_more": False, "next_cursor": None}
+            )
+
+        def do_PATCH(self):
+            if not self._admit():
+                return
+            body = self._body()
+            if body is None:
+                return
+            parts = self._parts()
+            block_id = parts[1]
+            if not self._exists(block_id):
+                return
+            if len(parts) == 2:
+                with state.lock:
+                    block = state.blocks[block_id]
+                    block["data"] = body[block["type"]]
+                    view = state.view(block_id)
+                return self._reply(200, view)
+            error = _validate_children(body.get("children", []))
+            if error:
+                state.counts["rejected"] += 1
+                return self._reply(400, {"code": "validation_error", "message": error})
+            with state.lock:
+                new_ids = [
+                    state.add_block(child, block_id) for child in body["children"]
+                ]
+                children = state.blocks[block_id]["children"]
+                after = body.get("after")
+                position = children.index(after) + 1 if after else len(children)
+                children[position:position] = new_ids
+                results = [state.view(child) for child in new_ids]
+            self._reply(200, {"results": results})
+
+        def do_DELETE(self):
+            if not self._admit():
+                return
+            block_id = self._parts()[1]
+            if not self._exists(block_id):
+                return
+            with state.lock:
+                block = state.blocks.pop(block_id)
+                state.blocks[block["parent"]]["children"].remove(block_id)
+            self._reply(200, {"object": "block", "id": block_id, "archived": True})
+
+    return Handler
+
+
+class FakeNotionServer:
+    """
+    Local HTTP stand-in for the Notion API endpoints NotionClient uses. It
+    enforces a token-bucket rate limit (429 + Retry-After), the 100-children
+    and 500KB payload limits and the 2000-character rich_text limit.
+    """
+
+    def __init__(self, requests_per_second: float = 3, burst: int = 3):
+        self.state = FakeNotionState(requests_per_second, burst)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self.state))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def __enter__(self) -> "FakeNotionServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
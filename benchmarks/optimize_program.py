@@ -0,0 +1,333 @@
+"""
+Offline prompt-efficiency harness for ProcessDocument.
+
+Candidate programs (with and without the chain-of-thought trace, verbose and
+concise instructions, optionally a COPRO instruction search) are run over a
+local evaluation set and scored on note quality against reference notes,
+input and output tokens and latency. The best program whose quality is
+within --quality-tolerance of the current default is saved to
+compiled_program_path, which GeminiProcessor loads at startup.
+
+The evaluation set is a folder of PDFs, each with a reference JSON file of
+the same name (`key_points`, `notes`, `summary`, as in ReadingNotes):
+
+    python benchmarks/optimize_program.py --eval-dir evaluation
+    python benchmarks/optimize_program.py --eval-dir evaluation --copro --dry-run
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "src"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import dspy  # noqa: E402
+from chunking import (  # noqa: E402
+    Chunk,
+    estimate_tokens,
+    merge_reading_notes,
+    split_into_chunks,
+)
+from dspy_modules import (  # noqa: E402
+    DocumentProcessor,
+    ProcessDocument,
+    ReadingNotes,
+    save_program,
+)
+from gemini_processor import GeminiProcessor  # noqa: E402
+from pdf_extraction import extract_pdf_text  # noqa: E402
+from run_benchmark import _git_commit  # noqa: E402
+from settings import load_settings  # noqa: E402
+from stub_lm import StubLM  # noqa: E402
+
+CONCISE_INSTRUCTIONS = (
+    DocumentProcessor.instructions.strip()
+    + "\nBe complete but economical: state each fact once across the key points, "
+    "notes and summary, and do not copy passages from the document."
+)
+
+# name -> ProcessDocument arguments; "default" is what runs without a
+# compiled program and sets the quality bar
+CANDIDATES = {
+    "default": dict(reasoning=True),
+    "no_reasoning": dict(reasoning=False),
+    "concise": dict(reasoning=True, instructions=CONCISE_INSTRUCTIONS),
+    "concise_no_reasoning": dict(reasoning=False, instructions=CONCISE_INSTRUCTIONS),
+}
+
+_WORD = re.compile(r"\w+")
+
+
+class EvalDocument(BaseModel):
+    name: str
+    chunks: list[Chunk]
+    reference: ReadingNotes
+
+
+class CandidateResult(BaseModel):
+    name: str
+    quality: float
+    input_tokens: float
+    output_tokens: float
+    seconds: float
+    objective: float
+    errors: int = 0
+
+
+def _f1(predicted: str, reference: str) -> float:
+    """Unigram F1 between two texts (ROUGE-1)."""
+    predicted_words = Counter(_WORD.findall(predicted.lower()))
+    reference_words = Counter(_WORD.findall(reference.lower()))
+    overlap = sum((predicted_words & reference_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(predicted_words.values())
+    recall = overlap / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def notes_quality(predicted: ReadingNotes, reference: ReadingNotes) -> float:
+    """Mean unigram F1 of the key points, notes and summary."""
+    return (
+        _f1("\n".join(predicted.key_points), "\n".join(reference.key_points))
+        + _f1(predicted.notes, reference.notes)
+        + _f1(predicted.summary, reference.summary)
+    ) / 3
+
+
+def load_eval_set(eval_dir: str, settings) -> list[EvalDocument]:
+    documents = []
+    for pdf_file in sorted(Path(eval_dir).glob("*.pdf")):
+        reference_file = pdf_file.with_suffix(".json")
+        if not reference_file.exists():
+            print(f"Skipping {pdf_file.name}: no {reference_file.name}")
+            continue
+        extraction = extract_pdf_text(
+            str(pdf_file),
+            settings.cache_dir,
+            preprocess=settings.preprocess_text,
+            backend=settings.extraction_backend,
+        )
+        documents.append(
+            EvalDocument(
+                name=pdf_file.name,
+                chunks=split_into_chunks(
+                    extraction.text,
+                    extraction.page_offsets,
+                    extraction.outline,
+                    settings.max_chunk_tokens,
+                ),
+                reference=ReadingNotes.model_validate_json(
+                    reference_file.read_text(encoding="utf-8")
+                ),
+            )
+        )
+    return documents
+
+
+def evaluate(name: str, program, documents: list[EvalDocument], args):
+    """Runs the program like GeminiProcessor does, without the notes cache."""
+    quality = input_tokens = output_tokens = seconds = 0.0
+    errors = 0
+    for document in documents:
+        parts = []
+        try:
+            for chunk in document.chunks:
+                started = time.perf_counter()
+                prediction = program(document_content=chunk.text)
+                seconds += time.perf_counter() - started
+                usage = GeminiProcessor._token_usage(prediction)
+                input_tokens += usage["prompt_tokens"]
+                output_tokens += usage["completion_tokens"]
+                parts.append((chunk, prediction.processed_document))
+        except Exception as e:
+            print(f"  {name}: {document.name} failed: {e}")
+            errors += 1
+            continue
+        quality += notes_quality(merge_reading_notes(parts), document.reference)
+    count = max(1, len(documents))
+    result = CandidateResult(
+        name=name,
+        quality=quality / count,
+        input_tokens=input_tokens / count,
+        output_tokens=output_tokens / count,
+        seconds=seconds / count,
+        objective=0.0,
+        errors=errors,
+    )
+    result.objective = (
+        result.quality
+        - args.input_weight * result.input_tokens / 1000
+        - args.output_weight * result.output_tokens / 1000
+        - args.latency_weight * result.seconds
+    )
+    return result
+
+
+def copro_program(program, documents: list[EvalDocument], args):
+    """
+    Searches instructions with COPRO, starting from `program`. The metric is
+    quality minus the output-token penalty, so shorter answers of equal
+    quality win.
+    """
+
+    def metric(example, prediction, trace=None):
+        notes = prediction.processed_document
+        generated = "\n".join([*notes.key_points, notes.notes, notes.summary])
+        return (
+            notes_quality(notes, example.reference)
+            - args.output_weight * estimate_tokens(generated) / 1000
+        )
+
+    trainset = [
+        dspy.Example(
+            document_content=document.chunks[0].text, reference=document.reference
+        ).with_inputs("document_content")
+        for document in documents
+        # Chunked documents have no per-chunk reference
+        if len(document.chunks) == 1
+    ]
+    optimizer = dspy.COPRO(metric=metric, breadth=args.copro_breadth, depth=2)
+    return optimizer.compile(
+        program, trainset=trainset, eval_kwargs={"display_progress": False}
+    )
+
+
+def summary_table(results: list[CandidateResult], chosen: str) -> str:
+    rows = [("program", "quality", "in tok", "out tok", "s/doc", "objective", "")]
+    for result in results:
+        rows.append(
+            (
+                result.name,
+                f"{result.quality:.3f}",
+                f"{result.input_tokens:.0f}",
+                f"{result.output_tokens:.0f}",
+                f"{result.seconds:.2f}",
+                f"{result.objective:.3f}",
+                "*" if result.name == chosen else "",
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--eval-dir", default=str(REPO_ROOT / "evaluation"))
+    parser.add_argument("--config", default=str(REPO_ROOT / "config.yaml"))
+    parser.add_argument("--model", help="Model to optimize for (default: model).")
+    parser.add_argument(
+        "--output", help="Where to save the program (default: compiled_program_path)."
+    )
+    parser.add_argument(
+        "--quality-tolerance",
+        type=float,
+        default=0.02,
+        help="Quality a candidate may lose against the default program.",
+    )
+    parser.add_argument(
+        "--input-weight", type=float, default=0.002, help="Penalty per 1k input tokens."
+    )
+    parser.add_argument(
+        "--output-weight",
+        type=float,
+        default=0.02,
+        help="Penalty per 1k output tokens.",
+    )
+    parser.add_argument(
+        "--latency-weight", type=float, default=0.002, help="Penalty per second."
+    )
+    parser.add_argument("--copro", action="store_true", help="Also run COPRO.")
+    parser.add_argument("--copro-breadth", type=int, default=4)
+    parser.add_argument(
+        "--stub", action="store_true", help="Use StubLM (smoke test, no API key)."
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Do not save.")
+    args = parser.parse_args()
+
+    if args.stub and args.copro:
+        # COPRO's instruction proposals need a real model to answer them
+        parser.error("--copro cannot be used with --stub")
+
+    load_dotenv()
+    settings = load_settings(args.config)
+    model = args.model or settings.model
+    if args.stub:
+        lm = StubLM(base_latency=0.05)
+    else:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise SystemExit("GEMINI_API_KEY is not set (or pass --stub).")
+        # Uncached, so every candidate pays its real tokens and latency
+        lm = dspy.LM(
+            model=model, api_key=api_key, max_tokens=settings.max_tokens, cache=False
+        )
+    dspy.configure(lm=lm, track_usage=True)
+
+    documents = load_eval_set(args.eval_dir, settings)
+    if not documents:
+        raise SystemExit(f"No PDFs with reference notes in {args.eval_dir}.")
+    print(f"Evaluating {len(CANDIDATES)} programs on {len(documents)} documents.")
+
+    programs = {name: ProcessDocument(**kwargs) for name, kwargs in CANDIDATES.items()}
+    results = [
+        evaluate(name, program, documents, args) for name, program in programs.items()
+    ]
+    if args.copro:
+        start = max(results, key=lambda result: result.objective).name
+        programs["copro"] = copro_program(programs[start], documents, args)
+        programs["copro"].reasoning = programs[start].reasoning
+        results.append(evaluate("copro", programs["copro"], documents, args))
+
+    baseline = results[0]
+    eligible = [
+        result
+        for result in results
+        if not result.errors
+        and result.quality >= baseline.quality - args.quality_tolerance
+    ] or [baseline]
+    chosen = max(eligible, key=lambda result: result.objective)
+    print(summary_table(results, chosen.name))
+    print(
+        f"Chosen: {chosen.name} ({chosen.output_tokens / max(1, baseline.output_tokens):.0%} "
+        "of the default program's output tokens)"
+    )
+
+    output = args.output or settings.compiled_program_path
+    if args.dry_run or not output:
+        return
+    save_program(
+        programs[chosen.name],
+        output,
+        {
+            "program": chosen.name,
+            "model": model,
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "documents": [document.name for document in documents],
+            "weights": {
+                "quality_tolerance": args.quality_tolerance,
+                "input": args.input_weight,
+                "output": args.output_weight,
+                "latency": args.latency_weight,
+            },
+            "results": [result.model_dump() for result in results],
+        },
+    )
+    print(f"Saved {chosen.name} to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Offline end-to-end benchmark for the extract -> LLM -> Notion pipeline.
+
+Gemini is replaced by StubLM and Notion by a local FakeNotionServer, so runs
+are free, repeatable and need no API keys. Results are written to
+benchmarks/results/ as JSON; pass --compare to diff against an earlier run.
+
+    python benchmarks/run_benchmark.py --sizes 5 50 200 1000
+    python benchmarks/run_benchmark.py --compare benchmarks/results/<file>.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "src"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import dspy  # noqa: E402
+from fake_notion import FakeNotionServer  # noqa: E402
+from stub_lm import StubLM  # noqa: E402
+from synthetic_pdfs import generate_corpus  # noqa: E402
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _peak_rss_mb() -> dict:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main_process": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "worker_processes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        / scale,
+    }
+
+
+def _micro_benchmarks(notion_client, corpus: list[str]) -> dict:
+    from extraction_backends import available_backends, calibrate
+    from pdf_extraction import extract_pdf_text
+
+    results = {}
+    text = "\n".join(f"Paragraph {index}. " + "word " * 120 for index in range(5000))
+    started = time.perf_counter()
+    blocks = notion_client._split_text_into_blocks(text, "paragraph")
+    results["split_text_into_blocks"] = {
+        "input_chars": len(text),
+        "blocks": len(blocks),
+        "seconds": time.perf_counter() - started,
+    }
+    for pdf_file in corpus:
+        for backend in available_backends():
+            report = extract_pdf_text(pdf_file, cache_dir=None, backend=backend)
+            # pypdf keeps the original key so older results stay comparable
+            prefix = "extract" if backend == "pypdf" else f"extract[{backend}]"
+            results[f"{prefix}:{Path(pdf_file).name}"] = {
+                "pages": report.pages,
+                "seconds": report.seconds,
+                "pages_per_second": (
+                    report.pages / report.seconds if report.seconds else 0
+                ),
+            }
+        selection = calibrate(pdf_file)
+        results[f"calibrate:{Path(pdf_file).name}"] = {
+            "backend": selection.backend,
+            "trials": [trial.model_dump() for trial in selection.trials],
+        }
+    return results
+
+
+def run(args) -> dict:
+    corpus = generate_corpus(args.corpus_dir, tuple(args.sizes))
+    workdir = Path(tempfile.mkdtemp(prefix="reading-notes-bench-"))
+    readings = workdir / "readings"
+    readings.mkdir()
+    pdf_files = []
+    for copy in range(args.copies):
+        for pdf_file in corpus:
+            target = readings / f"{Path(pdf_file).stem}_{copy}.pdf"
+            os.symlink(os.path.abspath(pdf_file), target)
+            pdf_files.append(str(target))
+
+    with open(REPO_ROOT / "config.yaml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config.update(
+        reading_folder=str(readings),
+        cache_dir=str(workdir / "cache"),
+        manifest_path=str(workdir / "cache" / "run_manifest.json"),
+        metrics_dir=str(workdir / "metrics"),
+        notion_requests_per_second=args.notion_rps,
+        # Measure the same program a real run would load
+        compiled_program_path=str(
+            REPO_ROOT
+            / config.get("compiled_program_path", "programs/process_document.json")
+        ),
+    )
+    with open(workdir / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    os.chdir(workdir)
+
+    from gemini_processor import GeminiProcessor
+    from metrics import tracer
+    from notion_client import NotionClient
+    from notion_transport import NotionTransport
+    from pipeline import ReadingPipeline
+    from run_manifest import RunManifest
+    from stage_checkpoints import CheckpointStore
+    from settings import load_settings
+
+    settings = load_settings()
+
+    with FakeNotionServer(args.notion_rps, burst=max(1, int(args.notion_rps))) as fake:
+        gemini_processor = GeminiProcessor("stub-key", settings=settings)
+        stub_lm = StubLM(args.llm_latency, args.llm_latency_per_1k)
+        # Every routed and fallback model answers through the stub
+        gemini_processor.lms = dict.fromkeys(gemini_processor.lms, stub_lm)
+        dspy.configure(lm=stub_lm, track_usage=True)
+        notion_client = NotionClient(
+            "stub-key",
+            "benchmark-database",
+            transport=NotionTransport(
+                "stub-key",
+                requests_per_second=args.notion_rps,
+                base_url=fake.base_url,
+            ),
+            upload_state_dir=str(workdir / "cache" / "uploads"),
+        )
+        pipeline = ReadingPipeline(
+            gemini_processor,
+            notion_client,
+            subject_id=None,
+            assignment_id=None,
+            manifest=RunManifest(settings.manifest_path),
+            checkpoints=CheckpointStore(str(workdir / "cache" / "checkpoints.sqlite")),
+            extract_workers=settings.extract_workers,
+            extraction_backend=settings.extraction_backend,
+            llm_concurrency=settings.llm_concurrency,
+            queue_size=settings.pipeline_queue_size,
+            cache_dir=settings.cache_dir,
+            max_chunk_tokens=settings.max_chunk_tokens,
+            upsert=settings.upsert,
+            preprocess=settings.preprocess_text,
+        )
+        started = time.perf_counter()
+        results = pipeline.run(sorted(pdf_files))
+        elapsed = time.perf_counter() - started
+        pipeline.close()
+        notion_counts = dict(fake.state.counts)
+
+    micro = _micro_benchmarks(notion_client, corpus) if not args.skip_micro else {}
+    failures = [result for result in results if result.error]
+    print(tracer.summary_table(group_by="model"))
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            "sizes": args.sizes,
+            "copies": args.copies,
+            "llm_latency": args.llm_latency,
+            "llm_latency_per_1k": args.llm_latency_per_1k,
+            "notion_rps": args.notion_rps,
+        },
+        "documents": len(results),
+        "failures": [
+            {"pdf_file": result.pdf_file, "error": result.error} for result in failures
+        ],
+        "wall_seconds": elapsed,
+        "documents_per_minute": len(results) / elapsed * 60 if elapsed else 0,
+        "stages": tracer.stage_stats(),
+        "notion_server": notion_counts,
+        "notion_transport": notion_client.transport.stats(),
+        "micro": micro,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    lines = [f"Comparison against {baseline['commit']} ({baseline['timestamp']}):"]
+    if current["parameters"] != baseline.get("parameters"):
+        lines.append("  warning: benchmark parameters differ between the runs")
+
+    def delta(name: str, new: float, old: float, higher_is_better: bool = False):
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = "better" if better else "worse" if change else "same"
+        lines.append(f"  {name}: {old:.3f} -> {new:.3f} ({change:+.1f}%, {marker})")
+
+    delta(
+        "documents_per_minute",
+        current["documents_per_minute"],
+        baseline["documents_per_minute"],
+        higher_is_better=True,
+    )
+    for stage, stats in current["stages"].items():
+        if stage in baseline.get("stages", {}):
+            for key in ("p50_seconds", "p95_seconds"):
+                delta(f"{stage}.{key}", stats[key], baseline["stages"][stage][key])
+    for name, stats in current["micro"].items():
+        if "seconds" in stats and name in baseline.get("micro", {}):
+            delta(f"micro.{name}", stats["seconds"], baseline["micro"][name]["seconds"])
+    delta(
+        "peak_rss_mb.main_process",
+        current["peak_rss_mb"]["main_process"],
+        baseline["peak_rss_mb"]["main_process"],
+    )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 200, 1000])
+    parser.add_argument(
+        "--copies", type=int, default=1, help="Documents per corpus size."
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-latency-per-1k", type=float, default=0.05)
+    parser.add_argument("--notion-rps", type=float, default=3)
+    parser.add_argument(
+        "--corpus-dir", default=str(REPO_ROOT / "benchmarks" / "corpus")
+    )
+    parser.add_argument(
+        "--output-dir", default=str(REPO_ROOT / "benchmarks" / "results")
+    )
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--skip-micro", action="store_true")
+    args = parser.parse_args()
+    args.corpus_dir = os.path.abspath(args.corpus_dir)
+    args.output_dir = os.path.abspath(args.output_dir)
+
+    result = run(args)
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = os.path.join(args.output_dir, f"{stamp}-{result['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(
+        f"{result['documents']} documents in {result['wall_seconds']:.1f}s "
+        f"({result['documents_per_minute']:.1f} docs/min, "
+        f"{len(result['failures'])} failed); "
+        f"peak RSS {result['peak_rss_mb']['main_process']:.0f} MB"
+    )
+    print(f"Results saved to {output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
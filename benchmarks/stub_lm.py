@@ -0,0 +1,68 @@
+import json
+import time
+from types import SimpleNamespace
+
+import dspy
+
+CHARS_PER_TOKEN = 4
+
+
+class StubLM(dspy.BaseLM):
+    """
+    Offline stand-in for the Gemini LM. Answers every DocumentProcessor call
+    with canned ReadingNotes after `base_latency` plus `latency_per_1k_tokens`
+    for each thousand (estimated) prompt tokens, and reports token usage the
+    same way a provider response does.
+    """
+
+    def __init__(
+        self,
+        base_latency: float = 0.5,
+        latency_per_1k_tokens: float = 0.05,
+        key_points: int = 12,
+    ):
+        super().__init__("stub/reading-notes", "chat", 0.0, 8000, cache=False)
+        self.base_latency = base_latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.key_points = key_points
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        text = prompt or "".join(m.get("content", "") for m in messages or [])
+        prompt_tokens = len(text) // CHARS_PER_TOKEN
+        time.sleep(
+            self.base_latency + self.latency_per_1k_tokens * prompt_tokens / 1000
+        )
+        notes = {
+            "key_points": [
+                f"Key point {index} about **agents** and search."
+                for index in range(self.key_points)
+            ],
+            "notes": "\n".join(
+                f"Notes paragraph {index}. " + "Reasoning about agents. " * 40
+                for index in range(6)
+            ),
+            "summary": "\n".join(
+                f"Summary paragraph {index}. " + "The chapter explains search. " * 40
+                for index in range(4)
+            ),
+        }
+        content = (
+            "[[ ## reasoning ## ]]\nCanned benchmark response.\n\n"
+            f"[[ ## processed_document ## ]]\n{json.dumps(notes)}\n\n"
+            "[[ ## completed ## ]]"
+        )
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(content=content, tool_calls=None),
+                    finish_reason="stop",
+                )
+            ],
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // CHARS_PER_TOKEN,
+                "total_tokens": prompt_tokens + len(content) // CHARS_PER_TOKEN,
+            },
+            model=self.model,
+            _hidden_params={},
+        )
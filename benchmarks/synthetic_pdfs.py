@@ -0,0 +1,93 @@
+import os
+import random
+
+from pypdf import PdfWriter
+from pypdf.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+)
+
+WORDS = (
+    "agent environment state action reward policy search heuristic model "
+    "knowledge reasoning planning uncertainty probability learning inference "
+    "network gradient representation logic constraint optimization perception "
+    "language rational utility decision evaluation algorithm complexity"
+).split()
+
+LINES_PER_PAGE = 42
+PAGES_PER_CHAPTER = 20
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 14))]
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng: random.Random, chapter: int, page_number: int) -> list[str]:
+    # Running header and footer repeat on every page, like a real textbook
+    lines = [f"Synthetic Textbook - Chapter {chapter}"]
+    body = []
+    while len(body) < LINES_PER_PAGE:
+        sentence = _sentence(rng)
+        while len(sentence) > 90:
+            cut = sentence.rfind(" ", 0, 90)
+            body.append(sentence[:cut])
+            sentence = sentence[cut + 1 :]
+        body.append(sentence)
+    lines.extend(body[:LINES_PER_PAGE])
+    lines.append(str(page_number))
+    return lines
+
+
+def write_synthetic_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """
+    Writes a text PDF with `pages` pages, a running header, page-number
+    footers and one top-level outline entry per chapter.
+    """
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    font_ref = writer._add_object(font)
+    for index in range(pages):
+        chapter = index // PAGES_PER_CHAPTER + 1
+        page = writer.add_blank_page(width=612, height=792)
+        operations = ["BT", "/F1 10 Tf", "14 TL", "50 750 Td"]
+        for line in _page_lines(rng, chapter, index + 1):
+            operations.append(f"({_escape(line)}) Tj T*")
+        operations.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(operations).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})}
+        )
+        if index % PAGES_PER_CHAPTER == 0:
+            writer.add_outline_item(f"Chapter {chapter}", index)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def generate_corpus(
+    directory: str, sizes: tuple[int, ...] = (5, 50, 200, 1000)
+) -> list[str]:
+    """Writes one synthetic PDF per page count, reusing files already present."""
+    paths = []
+    for size in sizes:
+        path = os.path.join(directory, f"synthetic_{size:04d}p.pdf")
+        if not os.path.exists(path):
+            write_synthetic_pdf(path, size, seed=size)
+        paths.append(path)
+    return paths
@@ -0,0 +1,115 @@
+import re
+
+from pydantic import BaseModel
+from dspy_modules import ReadingNotes
+
+# Rough average for English prose; only used to size chunks, not to bill.
+CHARS_PER_TOKEN = 4
+
+
+class Chunk(BaseModel):
+    title: str
+    text: str
+    start_page: int
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_by_budget(
+    text: str, max_chunk_tokens: int, title: str = "", start_page: int = 0
+) -> list[Chunk]:
+    """
+    Splits text into chunks of at most max_chunk_tokens, preferring paragraph
+    boundaries, then line boundaries, then a hard cut.
+    """
+    max_chars = max_chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start + max_chars // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        part = text[start:end]
+        if part.strip():
+            chunks.append(Chunk(title=title, text=part, start_page=start_page))
+        start = end
+    if len(chunks) > 1:
+        for number, chunk in enumerate(chunks, start=1):
+            chunk.title = f"{title} (part {number})" if title else f"Part {number}"
+    return chunks
+
+
+def split_into_chunks(
+    text: str,
+    page_offsets: list[int],
+    outline: list[tuple[str, int]],
+    max_chunk_tokens: int = 30000,
+) -> list[Chunk]:
+    """
+    Splits a document into chunks for map-reduce summarization.
+
+    Top-level outline entries define chapter boundaries when the PDF has at
+    least two of them; chapters larger than the budget, and documents without
+    an outline, fall back to token-budgeted splitting. A document that fits
+    in the budget is returned as a single chunk.
+    """
+    if estimate_tokens(text) <= max_chunk_tokens:
+        return [Chunk(title="", text=text, start_page=0)]
+
+    starts = [
+        (title, page, page_offsets[page])
+        for title, page in outline
+        if 0 <= page < len(page_offsets)
+    ]
+    if len(starts) < 2:
+        return split_by_budget(text, max_chunk_tokens)
+
+    # Front matter before the first chapter is folded into that chapter
+    starts[0] = (starts[0][0], 0, 0)
+    chunks = []
+    for index, (title, page, start) in enumerate(starts):
+        end = starts[index + 1][2] if index + 1 < len(starts) else len(text)
+        section = text[start:end]
+        if section.strip():
+            chunks.extend(split_by_budget(section, max_chunk_tokens, title, page))
+    return chunks
+
+
+def _normalize(point: str) -> str:
+    return re.sub(r"[\W_]+", " ", point.casefold()).strip()
+
+
+def merge_reading_notes(parts: list[tuple[Chunk, ReadingNotes]]) -> ReadingNotes:
+    """
+    Reduce step: concatenates key points in chunk order, dropping duplicates
+    that differ only in case, whitespace or punctuation, and stitches notes
+    and summaries together under their chunk titles.
+    """
+    if len(parts) == 1:
+        return parts[0][1]
+    key_points = []
+    seen = set()
+    notes = []
+    summaries = []
+    for chunk, reading_notes in parts:
+        for point in reading_notes.key_points:
+            normalized = _normalize(point)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                key_points.append(point)
+        heading = f"{chunk.title}\n" if chunk.title else ""
+        if reading_notes.notes.strip():
+            notes.append(f"{heading}{reading_notes.notes.strip()}")
+        if reading_notes.summary.strip():
+            summaries.append(f"{heading}{reading_notes.summary.strip()}")
+    return ReadingNotes(
+        key_points=key_points,
+        notes="\n\n".join(notes),
+        summary="\n\n".join(summaries),
+    )
@@ -0,0 +1,216 @@
+import json
+import os
+import random
+import threading
+import time
+
+from pydantic import BaseModel
+from logger_utils import setup_logger
+from run_manifest import hash_file
+
+
+class DeadLetter(BaseModel):
+    stage: str
+    error_class: str
+    error: str
+    # HTTP status for Notion API errors
+    status_code: int | None = None
+    attempts: int
+    size: int
+    mtime_ns: int
+    content_hash: str
+    first_failed_at: float
+    last_failed_at: float
+    # None once max_attempts is reached; the file is then left alone until
+    # it changes
+    next_attempt_at: float | None
+    # ReadingNotes (as a dict) when only the Notion stage failed
+    notes: dict | None = None
+
+
+class DeadLetterQueue:
+    """
+    Persistent record of documents that failed, with the failing stage,
+    error class and attempt count.
+
+    Retries follow an exponential backoff (base_delay * 2^(attempts - 1),
+    capped at max_delay, with jitter) across runs. When only the Notion
+    stage failed the generated notes are kept, so a retry publishes them
+    without extracting or summarizing again. An entry is dropped as soon as
+    the document succeeds or the file's content changes.
+    """
+
+    def __init__(
+        self,
+        path: str = "cache/dead_letters.json",
+        base_delay: float = 30,
+        max_delay: float = 3600,
+        max_attempts: int = 5,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.entries: dict[str, DeadLetter] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                self.entries = {
+                    key: DeadLetter.model_validate(value) for key, value in raw.items()
+                }
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable dead-letter file {path}: {e}")
+
+    @staticmethod
+    def _key(pdf_file: str) -> str:
+        return os.path.normcase(os.path.abspath(pdf_file))
+
+    def get(self, pdf_file: str) -> DeadLetter | None:
+        """Returns the entry for the file, dropping it if the file changed."""
+        key = self._key(pdf_file)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            try:
+                stat = os.stat(pdf_file)
+                unchanged = (stat.st_size, stat.st_mtime_ns) == (
+                    entry.size,
+                    entry.mtime_ns,
+                ) or (
+                    stat.st_size == entry.size
+                    and hash_file(pdf_file) == entry.content_hash
+                )
+            except OSError:
+                unchanged = False
+            if unchanged:
+                return entry
+            del self.entries[key]
+            self._save()
+        self.logger.info("Dropping dead letter for changed file %s", pdf_file)
+        return None
+
+    def is_due(self, pdf_file: str, now: float | None = None) -> bool:
+        entry = self.get(pdf_file)
+        if entry is None:
+            return True
+        if entry.next_attempt_at is None:
+            return False
+        return (now or time.time()) >= entry.next_attempt_at
+
+    def next_attempt_at(self, pdf_files: list[str]) -> float | None:
+        """Earliest scheduled retry among the files, if any is scheduled."""
+        times = [
+            entry.next_attempt_at
+            for entry in map(self.get, pdf_files)
+            if entry is not None and entry.next_attempt_at is not None
+        ]
+        return min(times) if times else None
+
+    def due_files(self, now: float | None = None) -> list[str]:
+        """Paths of all files whose scheduled retry has come."""
+        now = now or time.time()
+        with self.lock:
+            keys = list(self.entries)
+        due = []
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None and entry.next_attempt_at is not None:
+                if now >= entry.next_attempt_at:
+                    due.append(key)
+        return due
+
+    def notes(self, pdf_file: str) -> dict | None:
+        entry = self.get(pdf_file)
+        return entry.notes if entry is not None else None
+
+    def record(
+        self,
+        pdf_file: str,
+        stage: str,
+        error: BaseException,
+        notes: dict | None = None,
+    ) -> DeadLetter | None:
+        """
+        Records a failed attempt. Returns None, dropping any earlier entry,
+        when the file is gone: there is nothing left to retry.
+        """
+        now = time.time()
+        key = self._key(pdf_file)
+        try:
+            stat = os.stat(pdf_file)
+            content_hash = hash_file(pdf_file)
+        except OSError as e:
+            self.logger.warning(
+                "Not scheduling a retry for %s, which can no longer be read: %s",
+                pdf_file,
+                e,
+            )
+            self.resolve(pdf_file)
+            return None
+        with self.lock:
+            previous = self.entries.get(key)
+            attempts = previous.attempts + 1 if previous else 1
+            if attempts >= self.max_attempts:
+                next_attempt_at = None
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                next_attempt_at = now + delay * random.uniform(0.8, 1.2)
+            entry = DeadLetter(
+                stage=stage,
+                error_class=type(error).__name__,
+                error=str(error),
+                status_code=getattr(error, "status_code", None),
+                attempts=attempts,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                content_hash=content_hash,
+                first_failed_at=previous.first_failed_at if previous else now,
+                last_failed_at=now,
+                next_attempt_at=next_attempt_at,
+                # Keep notes from an earlier attempt if this one failed later
+                notes=notes if notes is not None else (previous and previous.notes),
+            )
+            self.entries[key] = entry
+            self._save()
+        if next_attempt_at is None:
+            self.logger.error(
+                "Giving up on %s after %d attempts (%s in %s stage); "
+                "it will be retried once the file changes.",
+                pdf_file,
+                attempts,
+                entry.error_class,
+                stage,
+            )
+        else:
+            self.logger.warning(
+                "Attempt %d for %s failed in %s stage (%s); retrying in %.0fs.",
+                attempts,
+                pdf_file,
+                stage,
+                entry.error_class,
+                next_attempt_at - now,
+            )
+        return entry
+
+    def resolve(self, pdf_file: str) -> None:
+        with self.lock:
+            if self.entries.pop(self._key(pdf_file), None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {key: entry.model_dump() for key, entry in self.entries.items()},
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
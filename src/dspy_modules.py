@@ -1,3 +1,7 @@
+import hashlib
+import json
+import os
+
 from pydantic import BaseModel, Field
 import dspy
 
@@ -32,10 +36,85 @@ class DocumentProcessor(dspy.Signature):
 
 
 class ProcessDocument(dspy.Module):
-    def __init__(self):
+    """
+    Generates ReadingNotes for a document. `reasoning=False` drops the
+    chain-of-thought trace; `instructions` replaces the signature's
+    instructions. Both are candidates in benchmarks/optimize_program.py.
+    """
+
+    def __init__(self, reasoning: bool = True, instructions: str | None = None):
         super().__init__()
-        self.generate_notes = dspy.ChainOfThought(DocumentProcessor)
+        self.reasoning = reasoning
+        signature = DocumentProcessor
+        if instructions is not None:
+            signature = signature.with_instructions(instructions)
+        predictor = dspy.ChainOfThought if reasoning else dspy.Predict
+        self.generate_notes = predictor(signature)
 
     def forward(self, document_content):
         response = self.generate_notes(document_content=document_content)
         return response
+
+
+def save_program(program: ProcessDocument, path: str, report: dict) -> None:
+    """
+    Writes a compiled program (its structure plus dspy state: instructions,
+    field descriptions and demos) together with the evaluation report that
+    selected it.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "reasoning": program.reasoning,
+                "state": program.dump_state(),
+                "report": report,
+            },
+            f,
+            indent=2,
+            default=str,
+        )
+    os.replace(tmp_path, path)
+
+
+def load_program(path: str | None) -> ProcessDocument | None:
+    """Loads a program saved by save_program, or None if there is none."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    program = ProcessDocument(reasoning=saved["reasoning"])
+    program.load_state(saved["state"])
+    return program
+
+
+def signature_fingerprint(program: ProcessDocument | None = None) -> str:
+    """
+    Returns a stable hash of the DocumentProcessor prompt surface.
+
+    Covers the signature instructions, every field description and the
+    ReadingNotes JSON schema, so editing any of them invalidates cached notes.
+    A compiled `program` adds its structure and dspy state.
+    """
+    fields = {
+        name: field.json_schema_extra
+        for name, field in {
+            **DocumentProcessor.input_fields,
+            **DocumentProcessor.output_fields,
+        }.items()
+    }
+    surface = {
+        "instructions": DocumentProcessor.instructions,
+        "fields": fields,
+        "reading_notes": ReadingNotes.model_json_schema(),
+    }
+    if program is not None:
+        surface["program"] = {
+            "reasoning": program.reasoning,
+            "state": program.dump_state(),
+        }
+    payload = json.dumps(surface, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
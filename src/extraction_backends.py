@@ -0,0 +1,200 @@
+import importlib.util
+import re
+import time
+
+from pydantic import BaseModel
+from pypdf import PdfReader
+
+_TOKEN = re.compile(r"\S+")
+_WORD = re.compile(r"^[^\W\d_]{1,24}[.,;:!?)\"']*$")
+
+
+class ExtractionBackend:
+    """
+    Text extraction for one open PDF. Subclasses wrap a PDF library; the
+    optional ones are only imported when used.
+    """
+
+    name = ""
+    module = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    def __init__(self, pdf_file: str):
+        self.pdf_file = pdf_file
+
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    def page_text(self, index: int) -> str:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PypdfBackend(ExtractionBackend):
+    name = "pypdf"
+    module = "pypdf"
+
+    def __init__(self, pdf_file: str, reader: PdfReader | None = None):
+        super().__init__(pdf_file)
+        self.reader = reader or PdfReader(pdf_file)
+
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text()
+
+
+class PyMuPDFBackend(ExtractionBackend):
+    name = "pymupdf"
+    module = "pymupdf"
+
+    def __init__(self, pdf_file: str):
+        super().__init__(pdf_file)
+        import pymupdf
+
+        self.document = pymupdf.open(pdf_file)
+
+    def page_count(self) -> int:
+        return self.document.page_count
+
+    def page_text(self, index: int) -> str:
+        # sort=True orders blocks top-to-bottom, left-to-right
+        return self.document[index].get_text("text", sort=True)
+
+    def close(self) -> None:
+        self.document.close()
+
+
+class PdfiumBackend(ExtractionBackend):
+    name = "pdfium"
+    module = "pypdfium2"
+
+    def __init__(self, pdf_file: str):
+        super().__init__(pdf_file)
+        import pypdfium2
+
+        self.document = pypdfium2.PdfDocument(pdf_file)
+
+    def page_count(self) -> int:
+        return len(self.document)
+
+    def page_text(self, index: int) -> str:
+        page = self.document[index]
+        text_page = page.get_textpage()
+        try:
+            return text_page.get_text_range()
+        finally:
+            text_page.close()
+            page.close()
+
+    def close(self) -> None:
+        self.document.close()
+
+
+BACKENDS: dict[str, type[ExtractionBackend]] = {
+    backend.name: backend for backend in (PypdfBackend, PyMuPDFBackend, PdfiumBackend)
+}
+
+
+def available_backends() -> list[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def open_backend(
+    name: str, pdf_file: str, reader: PdfReader | None = None
+) -> ExtractionBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown extraction backend: {name}")
+    if name == PypdfBackend.name:
+        return PypdfBackend(pdf_file, reader)
+    return BACKENDS[name](pdf_file)
+
+
+def text_quality(text: str) -> float:
+    """
+    Share of whitespace-separated tokens that look like words. Garbled
+    ordering, missing spaces and font-encoding junk all lower the score.
+    """
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return 0.0
+    return sum(bool(_WORD.match(token)) for token in tokens) / len(tokens)
+
+
+class BackendTrial(BaseModel):
+    backend: str
+    seconds_per_page: float
+    chars: int
+    quality: float
+    error: str | None = None
+
+
+class BackendSelection(BaseModel):
+    backend: str
+    trials: list[BackendTrial]
+
+
+def _sample_pages(page_count: int, samples: int) -> list[int]:
+    if page_count <= samples:
+        return list(range(page_count))
+    step = page_count / samples
+    return sorted({int(step * (number + 0.5)) for number in range(samples)})
+
+
+def calibrate(
+    pdf_file: str,
+    candidates: list[str] | None = None,
+    sample_pages: int = 5,
+    min_quality: float = 0.9,
+    reader: PdfReader | None = None,
+) -> BackendSelection:
+    """
+    Extracts a few evenly spaced pages with every candidate backend and
+    picks the fastest one whose text is acceptable: its word-likeness is at
+    least `min_quality` times the best backend's, and it recovers at least
+    `min_quality` of the most text any backend found.
+    """
+    trials = []
+    for name in candidates or available_backends():
+        try:
+            backend = open_backend(name, pdf_file, reader)
+            try:
+                pages = _sample_pages(backend.page_count(), sample_pages)
+                started = time.perf_counter()
+                text = "\n".join(backend.page_text(index) for index in pages)
+                seconds = time.perf_counter() - started
+            finally:
+                backend.close()
+            trials.append(
+                BackendTrial(
+                    backend=name,
+                    seconds_per_page=seconds / max(1, len(pages)),
+                    chars=len(text),
+                    quality=text_quality(text),
+                )
+            )
+        except Exception as e:
+            trials.append(
+                BackendTrial(
+                    backend=name, seconds_per_page=0, chars=0, quality=0, error=str(e)
+                )
+            )
+    usable = [trial for trial in trials if trial.error is None]
+    if not usable:
+        return BackendSelection(backend=PypdfBackend.name, trials=trials)
+    best_quality = max(trial.quality for trial in usable)
+    most_chars = max(trial.chars for trial in usable)
+    acceptable = [
+        trial
+        for trial in usable
+        if trial.quality >= min_quality * best_quality
+        and trial.chars >= min_quality * most_chars
+    ] or [max(usable, key=lambda trial: trial.quality)]
+    fastest = min(acceptable, key=lambda trial: trial.seconds_per_page)
+    return BackendSelection(backend=fastest.backend, trials=trials)
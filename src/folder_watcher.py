@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections.abc import Iterator
+
+from logger_utils import setup_logger
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional: fall back to polling
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self.wake = wake
+
+    def on_any_event(self, event) -> None:
+        self.wake.set()
+
+
+class FolderWatcher:
+    """
+    Yields batches of new or modified PDFs in `folder`.
+
+    A file is only handed out once its size and mtime have stayed the same
+    for `debounce_seconds`, so PDFs that are still being copied or
+    downloaded are not picked up half-written. Directory changes are
+    detected through inotify/FSEvents when the optional `watchdog` package
+    is installed; otherwise the folder is polled every `poll_interval`
+    seconds. Files present when the watcher is created count as seen.
+    With `idle_seconds`, an empty batch is yielded whenever that long has
+    passed without one, so the caller can do periodic work.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        debounce_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.folder = folder
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.seen = self._snapshot()
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        files = {}
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.is_file():
+                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def _start_observer(self):
+        if Observer is None:
+            self.logger.info(
+                "watchdog not installed; polling %s every %.1fs.",
+                self.folder,
+                self.poll_interval,
+            )
+            return None
+        observer = Observer()
+        observer.schedule(_WakeHandler(self.wake), self.folder, recursive=False)
+        observer.daemon = True
+        observer.start()
+        self.logger.info("Watching %s for new PDFs.", self.folder)
+        return observer
+
+    def batches(self, idle_seconds: float | None = None) -> Iterator[list[str]]:
+        observer = self._start_observer()
+        # path -> (size/mtime signature, monotonic time it was first seen)
+        candidates: dict[str, tuple[tuple[int, int], float]] = {}
+        last_batch = time.monotonic()
+        try:
+            while not self.stopped.is_set():
+                # With inotify there is nothing to do until an event arrives,
+                # unless a candidate is still waiting out its debounce window
+                if observer is not None and not candidates:
+                    timeout = None
+                else:
+                    timeout = min(self.poll_interval, self.debounce_seconds)
+                if idle_seconds is not None:
+                    idle_left = max(0.0, last_batch + idle_seconds - time.monotonic())
+                    timeout = idle_left if timeout is None else min(timeout, idle_left)
+                self.wake.wait(timeout)
+                self.wake.clear()
+                if self.stopped.is_set():
+                    return
+
+                current = self._snapshot()
+                now = time.monotonic()
+                for path in list(candidates):
+                    if path not in current:
+                        del candidates[path]
+                for path in list(self.seen):
+                    if path not in current:
+                        del self.seen[path]
+                for path, signature in current.items():
+                    if self.seen.get(path) == signature:
+                        candidates.pop(path, None)
+                        continue
+                    previous = candidates.get(path)
+                    if previous is None or previous[0] != signature:
+                        candidates[path] = (signature, now)
+
+                ready = sorted(
+                    path
+                    for path, (_, since) in candidates.items()
+                    if now - since >= self.debounce_seconds
+                )
+                for path in ready:
+                    self.seen[path] = candidates.pop(path)[0]
+                if ready:
+                    self.logger.info("Detected %d new or changed PDFs.", len(ready))
+                if ready or (
+                    idle_seconds is not None and now - last_batch >= idle_seconds
+                ):
+                    yield ready
+                    last_batch = time.monotonic()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.wake.set()
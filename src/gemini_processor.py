@@ -1,39 +1,206 @@
+import contextvars
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from logger_utils import setup_logger
 import dspy
-import yaml
-from dspy_modules import ProcessDocument, ReadingNotes
+import litellm
+from dspy_modules import (
+    ProcessDocument,
+    ReadingNotes,
+    load_program,
+    signature_fingerprint,
+)
+from notes_cache import NotesCache
+from chunking import Chunk, estimate_tokens, merge_reading_notes
+from metrics import tracer
+from settings import ModelRoute, Settings, load_settings
+
+# Errors after which the next model in the cascade is tried; anything else
+# (a bad prompt, an unparseable answer) would fail the same way again
+FALLBACK_ERRORS = (
+    litellm.RateLimitError,
+    litellm.Timeout,
+    litellm.ServiceUnavailableError,
+    litellm.InternalServerError,
+    litellm.BadGatewayError,
+    litellm.APIConnectionError,
+    litellm.ContextWindowExceededError,
+    TimeoutError,
+)
 
 
 class GeminiProcessor:
-    def __init__(self, api_key, log_level_str: str = "WARNING"):
+    """
+    Summarizes documents with dspy, routing each one by its estimated input
+    tokens. `model_routes` are tried from the smallest `max_input_tokens`
+    up and the first that fits the document is used; a timeout, rate limit
+    or overloaded model moves on to the next route that fits and then to
+    `fallback_models`. Every attempt is recorded as an "llm" span carrying
+    the model, route and token estimate.
+    """
+
+    def __init__(
+        self, api_key, log_level_str: str = "WARNING", settings: Settings = None
+    ):
         self.logger = setup_logger(__name__, log_level_str)
-        with open("config.yaml", "r") as f:
-            config = yaml.safe_load(f)
-        max_tokens = config.get("max_tokens", 4000)  # Default to 4000 if not specified
-        model_name = config.get(
-            "model", "gemini/gemini-2.5-pro"
-        )  # Default to "gemini/gemini-2.5-pro" if not specified
-        self.dspy_lm = dspy.LM(model=model_name, api_key=api_key, max_tokens=max_tokens)
-        dspy.configure(lm=self.dspy_lm)
-        self.document_processor = ProcessDocument()
+        settings = settings or load_settings()
+        self.routes = sorted(
+            settings.model_routes
+            or [ModelRoute(model=settings.model, max_tokens=settings.max_tokens)],
+            key=lambda route: (route.max_input_tokens is None, route.max_input_tokens),
+        )
+        self.fallback_models = settings.fallback_models
+        # One LM per (model, max_tokens); the benchmark swaps in a stub
+        self.lms: dict[tuple[str, int], dspy.BaseLM] = {}
+        for route in self.routes:
+            for model in [route.model, *self.fallback_models]:
+                if (model, route.max_tokens) not in self.lms:
+                    self.lms[(model, route.max_tokens)] = dspy.LM(
+                        model=model,
+                        api_key=api_key,
+                        max_tokens=route.max_tokens,
+                        timeout=settings.llm_timeout_seconds,
+                    )
+        default_route = self.routes[0]
+        dspy.configure(
+            lm=self.lms[(default_route.model, default_route.max_tokens)],
+            track_usage=True,
+        )
+        # Program selected by benchmarks/optimize_program.py, if one was saved
+        compiled = load_program(settings.compiled_program_path)
+        if compiled is not None:
+            self.logger.info(
+                "Loaded compiled program from %s", settings.compiled_program_path
+            )
+        self.document_processor = compiled or ProcessDocument()
+        self.signature = signature_fingerprint(compiled)
+        self.cache = NotesCache(
+            cache_dir=settings.cache_dir,
+            max_bytes=int(settings.cache_max_mb * 1024 * 1024),
+            max_age_days=settings.cache_max_age_days,
+            log_level_str=log_level_str,
+        )
+        # Shared by every caller, so this bounds concurrent model calls globally
+        self.chunk_executor = ThreadPoolExecutor(max_workers=settings.chunk_concurrency)
+
+    def cascade(self, input_tokens: int) -> list[tuple[str, str, int]]:
+        """
+        (route label, model, max_tokens) to try, in order, for a document of
+        `input_tokens` estimated tokens.
+        """
+        fitting = [
+            route
+            for route in self.routes
+            if route.max_input_tokens is None or input_tokens <= route.max_input_tokens
+        ] or [self.routes[-1]]
+        candidates = [
+            (f"route:{route.max_input_tokens or 'max'}", route.model, route.max_tokens)
+            for route in fitting
+        ]
+        # Fallbacks keep the output budget of the route the document fits
+        candidates += [
+            ("fallback", model, fitting[0].max_tokens) for model in self.fallback_models
+        ]
+        unique = {}
+        for route, model, max_tokens in candidates:
+            unique.setdefault((model, max_tokens), route)
+        return [(route, *lm_key) for lm_key, route in unique.items()]
+
+    def process_chunks(self, chunks: list[Chunk]) -> ReadingNotes:
+        """
+        Map-reduce over chunks: each chunk is summarized in parallel, then the
+        per-chunk notes are merged in document order.
+        """
+        if len(chunks) == 1:
+            return self.process_document(chunks[0].text)
+        self.logger.info("Summarizing document in %d chunks.", len(chunks))
+        # Copy the context so chunk spans are attributed to the current document
+        futures = [
+            self.chunk_executor.submit(
+                contextvars.copy_context().run, self.process_document, chunk.text
+            )
+            for chunk in chunks
+        ]
+        return merge_reading_notes(
+            [(chunk, future.result()) for chunk, future in zip(chunks, futures)]
+        )
 
     def process_document(self, text: str) -> ReadingNotes:
-        try:
-            self.logger.debug("Sending document to dspy for processing.")
-            response: ReadingNotes = self.document_processor(
-                document_content=text
-            ).processed_document
-            self.logger.info(f"Received response from dspy: {response}")
-            return response
-        except Exception as e:
-            self.logger.error(f"Error processing document with dspy: {e}")
-            return ReadingNotes(
-                key_points=[],
-                notes="Error generating notes.",
-                summary="Error generating summary.",
+        input_tokens = estimate_tokens(text)
+        cascade = self.cascade(input_tokens)
+        keys = {
+            (model, max_tokens): NotesCache.make_key(
+                text, model, max_tokens, self.signature
+            )
+            for _, model, max_tokens in cascade
+        }
+        # Notes from any model in the cascade are good enough
+        for route, model, max_tokens in cascade:
+            cached = self.cache.get(keys[(model, max_tokens)])
+            if cached is not None:
+                tracer.record(
+                    "llm",
+                    0.0,
+                    model=model,
+                    route=route,
+                    input_tokens_estimate=input_tokens,
+                    cache_hit=True,
+                )
+                self.logger.info("Using cached notes for document from %s.", model)
+                return cached
+        for attempt, (route, model, max_tokens) in enumerate(cascade):
+            self.logger.info(
+                "Routing document (~%d tokens) to %s (%s).", input_tokens, model, route
             )
+            try:
+                with tracer.span(
+                    "llm",
+                    model=model,
+                    route=route,
+                    input_chars=len(text),
+                    input_tokens_estimate=input_tokens,
+                    fallback=attempt > 0,
+                    cache_hit=False,
+                ) as span:
+                    with dspy.context(lm=self.lms[(model, max_tokens)]):
+                        prediction = self.document_processor(document_content=text)
+                    span.update(self._token_usage(prediction))
+            except FALLBACK_ERRORS as e:
+                if attempt + 1 < len(cascade):
+                    self.logger.warning(
+                        "%s failed with %s; falling back to %s.",
+                        model,
+                        type(e).__name__,
+                        cascade[attempt + 1][1],
+                    )
+                    continue
+                self.logger.error(f"Error processing document with dspy: {e}")
+                raise
+            except Exception as e:
+                # Raised so the pipeline dead-letters the document instead of
+                # publishing placeholder notes
+                self.logger.error(f"Error processing document with dspy: {e}")
+                raise
+            response: ReadingNotes = prediction.processed_document
+            self.logger.info("Received response from dspy: %s", response)
+            self.cache.put(keys[(model, max_tokens)], response)
+            return response
+
+    @staticmethod
+    def _token_usage(prediction) -> dict:
+        """Sums prompt/completion tokens recorded in the dspy LM history."""
+        usage = prediction.get_lm_usage() or {}
+        return {
+            "prompt_tokens": sum(
+                (model_usage.get("prompt_tokens") or 0)
+                for model_usage in usage.values()
+            ),
+            "completion_tokens": sum(
+                (model_usage.get("completion_tokens") or 0)
+                for model_usage in usage.values()
+            ),
+        }
 
 
 if __name__ == "__main__":
@@ -57,5 +224,5 @@ if __name__ == "__main__":
     gemini_processor = GeminiProcessor(gemini_api_key, log_level_str=log_level_str)
     processed_content = gemini_processor.process_document(sample_text_to_summarize)
     gemini_processor.logger.info(
-        f"Processed content of sample text: {processed_content}"
+        "Processed content of sample text: %s", processed_content
     )
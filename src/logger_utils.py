@@ -1,11 +1,72 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_queue_handler: logging.Handler | None = None
+_listener: logging.handlers.QueueListener | None = None
+_lock = threading.Lock()
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them. The stock QueueHandler merges
+    msg % args on the calling thread; here that work happens on the listener
+    thread, so a log call on the hot path only costs a queue put.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _get_queue_handler() -> logging.Handler:
+    """
+    Starts the shared background listener on first use. Every logger feeds
+    one queue; a single thread writes to the console and to a size-rotated
+    logging/app.log.
+    """
+    global _queue_handler, _listener
+    with _lock:
+        if _queue_handler is None:
+            formatter = logging.Formatter(LOG_FORMAT)
+
+            # Console handler
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+
+            # File handler, rotated by size so long batch runs stay bounded
+            log_dir = "logging"
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, "app.log"),
+                maxBytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+                backupCount=int(os.getenv("LOG_BACKUP_COUNT", 5)),
+                encoding="utf-8",
+            )
+            file_handler.setFormatter(formatter)
+
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            _listener = logging.handlers.QueueListener(
+                log_queue, console_handler, file_handler, respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(_listener.stop)
+            _queue_handler = _LazyQueueHandler(log_queue)
+    return _queue_handler
 
 
 def setup_logger(name: str, log_level_str: str = "WARNING") -> logging.Logger:
     """
     Sets up a logger with a configurable log level and file output.
 
+    Records are handed to a shared background thread through a queue and
+    formatted there, so call sites should pass arguments lazily
+    (logger.info("... %s", value)) rather than building f-strings.
+
     Args:
         name: The name of the logger (usually __name__).
         log_level_str: The desired log level as a string (e.g., "DEBUG", "INFO", "WARNING").
@@ -24,33 +85,10 @@ def setup_logger(name: str, log_level_str: str = "WARNING") -> logging.Logger:
     log_level = log_level_map.get(log_level_str.upper(), logging.WARNING)
 
     logger = logging.getLogger(name)
-    if not logger.handlers:
-        logger.setLevel(log_level)
-        formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-
-        # File handler
-        log_dir = "logging"
-        os.makedirs(log_dir, exist_ok=True)
-        file_handler = logging.FileHandler(os.path.join(log_dir, "app.log"))
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    else:
-        # If handlers already exist, ensure the level is set correctly
-        logger.setLevel(log_level)
-        for handler in logger.handlers:
-            # Re-apply formatter in case it was changed or for new handlers
-            handler.setFormatter(
-                logging.Formatter(
-                    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-                )
-            )
+    logger.setLevel(log_level)
+    queue_handler = _get_queue_handler()
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
 
     return logger
 
@@ -58,7 +96,7 @@ def setup_logger(name: str, log_level_str: str = "WARNING") -> logging.Logger:
 # Example of how to use it in a module:
 # logger = setup_logger(__name__, os.getenv("LOG_LEVEL", "WARNING"))
 # logger.debug("This is a debug message")
-# logger.info("This is an info message")
+# logger.info("Processed %d pages from %s", page_count, pdf_file)
 # logger.warning("This is a warning message")
 # logger.error("This is an error message")
 # logger.critical("This is a critical message")
@@ -1,17 +1,90 @@
+import argparse
 import os
+import time
 from datetime import datetime
-from gemini_processor import GeminiProcessor
-from notion_client import NotionClient
 from dotenv import load_dotenv
 from logger_utils import setup_logger
-import yaml  # Import yaml
-from pypdf import PdfReader  # Import PdfReader
 import glob  # Import glob
-from pathlib import Path  # Import Path
-from dspy_modules import ReadingNotes
+import yaml
+from pydantic import ValidationError
+from dead_letters import DeadLetterQueue
+from run_manifest import RunManifest
+from settings import load_settings
+
+
+def _pending(
+    manifest: RunManifest,
+    dead_letters: DeadLetterQueue,
+    pdf_files: list[str],
+    logger,
+    refresh: bool = False,
+) -> list[str]:
+    pending_files = []
+    for pdf_file in pdf_files:
+        if not refresh and manifest.is_unchanged(pdf_file):
+            logger.info("Skipping unchanged PDF file: %s", pdf_file)
+        elif not dead_letters.is_due(pdf_file):
+            logger.info("Skipping failed PDF file until its next retry: %s", pdf_file)
+        else:
+            pending_files.append(pdf_file)
+    return pending_files
+
+
+def _process(pipeline, pdf_files: list[str], settings, logger) -> None:
+    from metrics import tracer
+
+    pdf_files = sorted(pdf_files)
+    while pdf_files:
+        failed = []
+        for result in pipeline.run(pdf_files):
+            if result.error:
+                logger.error(f"Failed {result.pdf_file}: {result.error}")
+                failed.append(result.pdf_file)
+            else:
+                logger.info("Published %s as page %s", result.pdf_file, result.page_id)
+        # Wait for a retry within this run only if one is due soon; the rest
+        # are picked up by later runs once their backoff has passed
+        retry_at = pipeline.dead_letters.next_attempt_at(failed)
+        if (
+            retry_at is None
+            or retry_at - time.time() > settings.retry_wait_in_run_seconds
+        ):
+            break
+        time.sleep(max(0.0, retry_at - time.time()))
+        pdf_files = [
+            pdf_file for pdf_file in failed if pipeline.dead_letters.is_due(pdf_file)
+        ]
+        logger.info("Retrying %d failed PDF files.", len(pdf_files))
+
+    logger.info("Notes cache stats: %s", pipeline.gemini_processor.cache.stats())
+    logger.info("Notion transport stats: %s", pipeline.notion_client.transport.stats())
+
+    metrics_dir = settings.metrics_dir
+    tracer.export_jsonl(os.path.join(metrics_dir, "spans.jsonl"))
+    tracer.export_prometheus(os.path.join(metrics_dir, "metrics.prom"))
+    # LLM latency per model, for tuning model_routes
+    print(tracer.summary_table(group_by="model"))
+    # export_jsonl appends, so start the next batch (watch mode) empty
+    tracer.reset()
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Generate AI reading notes for PDFs and push them to Notion."
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and process PDFs as they are added to reading_folder.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Process already-published PDFs again (e.g. after a prompt or model "
+        "change) and update their Notion pages in place.",
+    )
+    args = parser.parse_args()
+
     load_dotenv()
     log_level_str = os.getenv("LOG_LEVEL", "WARNING").upper()
     logger = setup_logger(__name__, log_level_str)
@@ -34,80 +107,123 @@ def main():
 
     # Load config.yaml
     try:
-        with open("config.yaml", "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-        subject_id = config.get("subject_id")
-        assignment_id = config.get("assignments_id")
-        reading_template_id = config.get("reading_template_id")
-
-        # Prompts are no longer needed as dspy handles the prompting internally
-        # prompts_config = config.get("prompts", [])
-        # active_prompt_name = config.get("active_prompt", "default_reading_prompt")
-
-        # selected_prompt_content = next(
-        #     (p["content"] for p in prompts_config if p["name"] == active_prompt_name),
-        #     None,
-        # )
-
-        # if not selected_prompt_content:
-        #     logger.error(
-        #         f"Active prompt '{active_prompt_name}' not found in config.yaml."
-        #     )
-        #     return
-
+        settings = load_settings()
     except FileNotFoundError:
         logger.error(
             "config.yaml not found. Please create it with subject_id and assignments_id."
         )
         return
-    except yaml.YAMLError as e:
+    except (yaml.YAMLError, ValidationError) as e:
         logger.error(f"Error reading config.yaml: {e}")
         return
 
-    gemini_processor = GeminiProcessor(gemini_api_key, log_level_str=log_level_str)
-
-    notion_client = NotionClient(
-        notion_api_key,
-        notion_database_id,
-        reading_template_id=reading_template_id,
-        log_level_str=log_level_str,
-    )
-
     # Process PDF files in the 'readings' directory
-    readings_dir = config.get("reading_folder")
+    readings_dir = settings.reading_folder
     pdf_files = glob.glob(os.path.join(readings_dir, "*.pdf"))
 
-    if not pdf_files:
+    if not pdf_files and not args.watch:
         logger.info(f"No PDF files found in the '{readings_dir}' directory.")
         return
 
-    for pdf_file in pdf_files:
-        logger.info(f"Processing PDF file: {pdf_file}")
-        try:
-            reader = PdfReader(pdf_file)
-            pdf_content = ""
-            for page in reader.pages:
-                pdf_content += page.extract_text()
-
-            processed_content: ReadingNotes = gemini_processor.process_document(
-                pdf_content
-            )
+    manifest = RunManifest(settings.manifest_path, log_level_str=log_level_str)
+    dead_letters = DeadLetterQueue(
+        settings.dead_letter_path,
+        base_delay=settings.retry_base_seconds,
+        max_delay=settings.retry_max_seconds,
+        max_attempts=settings.retry_max_attempts,
+        log_level_str=log_level_str,
+    )
+    pending_files = _pending(
+        manifest, dead_letters, pdf_files, logger, refresh=args.refresh
+    )
 
-            file_name = Path(pdf_file).stem
-            title = f"Reading Summary: {file_name}"
+    if not pending_files and not args.watch:
+        logger.info("No new, changed or due PDF files among %d.", len(pdf_files))
+        return
 
-            notion_client.create_reading_page(
-                title=title,
-                subject_id=subject_id,
-                assignment_id=assignment_id,
-                key_points=processed_content.key_points,
-                notes=processed_content.notes,
-                summary=processed_content.summary,
-            )
-            logger.info(f"Created Notion page for {file_name}")
+    if args.watch:
+        from folder_watcher import FolderWatcher
+
+        # Created before the first batch so files added meanwhile are seen
+        watcher = FolderWatcher(
+            readings_dir,
+            debounce_seconds=settings.watch_debounce_seconds,
+            poll_interval=settings.watch_poll_seconds,
+            log_level_str=log_level_str,
+        )
+
+    # Deferred so runs with nothing to do never load dspy, pypdf or requests
+    from gemini_processor import GeminiProcessor
+    from notion_client import NotionClient
+    from pipeline import ReadingPipeline
+    from similarity_index import SimilarityIndex
+    from stage_checkpoints import CheckpointStore
 
-        except Exception as e:
-            logger.error(f"Error processing {pdf_file}: {e}")
+    gemini_processor = GeminiProcessor(
+        gemini_api_key, log_level_str=log_level_str, settings=settings
+    )
+
+    notion_client = NotionClient(
+        notion_api_key,
+        notion_database_id,
+        log_level_str=log_level_str,
+        settings=settings,
+    )
+
+    pipeline = ReadingPipeline(
+        gemini_processor,
+        notion_client,
+        subject_id=settings.subject_id,
+        assignment_id=settings.assignments_id,
+        manifest=manifest,
+        dead_letters=dead_letters,
+        checkpoints=CheckpointStore(
+            settings.checkpoint_path, log_level_str=log_level_str
+        ),
+        extract_workers=settings.extract_workers,
+        extraction_backend=settings.extraction_backend,
+        llm_concurrency=settings.llm_concurrency,
+        queue_size=settings.pipeline_queue_size,
+        cache_dir=settings.cache_dir,
+        max_chunk_tokens=settings.max_chunk_tokens,
+        upsert=settings.upsert,
+        refresh=args.refresh,
+        preprocess=settings.preprocess_text,
+        similarity_index=(
+            SimilarityIndex(
+                settings.cache_dir,
+                threshold=settings.duplicate_threshold,
+                log_level_str=log_level_str,
+            )
+            if settings.detect_duplicates
+            else None
+        ),
+        log_level_str=log_level_str,
+    )
+    try:
+        if pending_files:
+            _process(pipeline, pending_files, settings, logger)
+        if args.watch:
+            # The LM, notes cache, Notion session and extraction workers stay
+            # warm, so each new PDF only pays extraction and LLM latency
+            # Wakes at least every poll interval so failed files whose retry
+            # was too far off to wait for in _process are picked up when due
+            for batch in watcher.batches(idle_seconds=settings.watch_poll_seconds):
+                queued = {os.path.abspath(pdf_file) for pdf_file in batch}
+                retries = [
+                    pdf_file
+                    for pdf_file in dead_letters.due_files()
+                    if os.path.abspath(pdf_file) not in queued
+                ]
+                pending_files = _pending(
+                    manifest, dead_letters, batch + retries, logger
+                )
+                if pending_files:
+                    _process(pipeline, pending_files, settings, logger)
+    except KeyboardInterrupt:
+        logger.info("Stopping.")
+    finally:
+        pipeline.close()
 
 
 if __name__ == "__main__":
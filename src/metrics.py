@@ -0,0 +1,188 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections.abc import Iterator
+
+from pydantic import BaseModel
+
+# Document the current thread is working on; spans pick it up by default.
+current_document: ContextVar[str] = ContextVar("current_document", default="")
+
+
+class Span(BaseModel):
+    stage: str
+    document: str
+    started_at: float
+    seconds: float
+    status: str = "ok"
+    attributes: dict[str, str | int | float | bool | None] = {}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Tracer:
+    """
+    Collects per-stage spans (duration plus counters such as pages, bytes and
+    tokens) for the extract -> LLM -> Notion pipeline and exports them as
+    JSON lines, a Prometheus text file and a p50/p95 summary table.
+    """
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(
+        self, stage: str, document: str | None = None, **attributes
+    ) -> Iterator[dict]:
+        """
+        Times the enclosed block. The yielded dict can be filled with extra
+        attributes; an exception marks the span as an error and propagates.
+        """
+        started_at = time.time()
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attributes
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(
+                stage,
+                time.perf_counter() - started,
+                document=document,
+                status=status,
+                started_at=started_at,
+                **attributes,
+            )
+
+    def record(
+        self,
+        stage: str,
+        seconds: float,
+        document: str | None = None,
+        status: str = "ok",
+        started_at: float | None = None,
+        **attributes,
+    ) -> None:
+        span = Span(
+            stage=stage,
+            document=document if document is not None else current_document.get(),
+            started_at=started_at if started_at is not None else time.time() - seconds,
+            seconds=seconds,
+            status=status,
+            attributes=attributes,
+        )
+        with self.lock:
+            self.spans.append(span)
+
+    def _by_stage(self, group_by: str | None = None) -> dict[str, list[Span]]:
+        """
+        Spans per stage. With `group_by`, spans carrying that attribute are
+        split further into "stage[value]" groups, e.g. "llm[gemini/...]".
+        """
+        with self.lock:
+            spans = list(self.spans)
+        stages: dict[str, list[Span]] = {}
+        for span in spans:
+            stage = span.stage
+            if group_by is not None and span.attributes.get(group_by) is not None:
+                stage = f"{stage}[{span.attributes[group_by]}]"
+            stages.setdefault(stage, []).append(span)
+        return stages
+
+    def export_jsonl(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(span.model_dump_json() + "\n")
+
+    def export_prometheus(self, path: str) -> None:
+        lines = [
+            "# HELP reading_notes_stage_seconds Pipeline stage latency in seconds.",
+            "# TYPE reading_notes_stage_seconds summary",
+        ]
+        counters: dict[tuple[str, str], float] = {}
+        for stage, spans in sorted(self._by_stage().items()):
+            durations = sorted(span.seconds for span in spans)
+            for q in (0.5, 0.95):
+                lines.append(
+                    f'reading_notes_stage_seconds{{stage="{stage}",quantile="{q}"}} '
+                    f"{percentile(durations, q):.6f}"
+                )
+            lines.append(
+                f'reading_notes_stage_seconds_sum{{stage="{stage}"}} {sum(durations):.6f}'
+            )
+            lines.append(
+                f'reading_notes_stage_seconds_count{{stage="{stage}"}} {len(durations)}'
+            )
+            for span in spans:
+                if span.status != "ok":
+                    key = ("errors", stage)
+                    counters[key] = counters.get(key, 0) + 1
+                for name, value in span.attributes.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        key = (name, stage)
+                        counters[key] = counters.get(key, 0) + value
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE reading_notes_{name}_total counter")
+            for (counter, stage), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(
+                        f'reading_notes_{name}_total{{stage="{stage}"}} {value:g}'
+                    )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def stage_stats(self, group_by: str | None = None) -> dict[str, dict]:
+        stats = {}
+        for stage, spans in sorted(self._by_stage(group_by).items()):
+            durations = sorted(span.seconds for span in spans)
+            stats[stage] = {
+                "count": len(spans),
+                "errors": sum(span.status != "ok" for span in spans),
+                "p50_seconds": percentile(durations, 0.5),
+                "p95_seconds": percentile(durations, 0.95),
+                "max_seconds": durations[-1],
+            }
+        return stats
+
+    def summary_table(self, group_by: str | None = None) -> str:
+        rows = [("stage", "count", "errors", "p50 s", "p95 s", "max s")]
+        for stage, stats in self.stage_stats(group_by).items():
+            rows.append(
+                (
+                    stage,
+                    str(stats["count"]),
+                    str(stats["errors"]),
+                    f"{stats['p50_seconds']:.3f}",
+                    f"{stats['p95_seconds']:.3f}",
+                    f"{stats['max_seconds']:.3f}",
+                )
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+            for row in rows
+        )
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans = []
+
+
+tracer = Tracer()
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from pydantic import BaseModel
+from logger_utils import setup_logger
+from dspy_modules import ReadingNotes
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+class NotesCache:
+    """
+    Content-addressed SQLite cache for ReadingNotes produced by the LLM stage.
+
+    Entries are keyed on a hash of the extracted text, the model name, the
+    max_tokens budget and the DocumentProcessor signature fingerprint, so any
+    change to the input or the prompt surface results in a fresh model call.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "cache",
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age_days: float = 90,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "notes_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS notes (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(text: str, model_name: str, max_tokens: int, signature: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name, str(max_tokens), signature):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(text.encode("utf-8", errors="surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> ReadingNotes | None:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM notes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE notes SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+            self.hits += 1
+        self.logger.debug("Notes cache hit for key %.12s", key)
+        return ReadingNotes.model_validate_json(row[0])
+
+    def put(self, key: str, notes: ReadingNotes) -> None:
+        value = notes.model_dump_json()
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO notes (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Drops entries older than max_age_days, then the least recently used
+        entries until the cache fits in max_bytes. Returns the number removed.
+        """
+        with self.lock:
+            removed = self.conn.execute(
+                "DELETE FROM notes WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,),
+            ).rowcount
+            total = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM notes"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self.conn.execute(
+                    "SELECT key, size FROM notes ORDER BY accessed_at ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM notes WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+            self.conn.commit()
+        if removed:
+            self.logger.info("Evicted %d entries from notes cache.", removed)
+        return removed
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM notes"
+            ).fetchone()
+        return CacheStats(
+            hits=self.hits, misses=self.misses, entries=entries, bytes=size
+        )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,201 @@
+"""
+Compiles note text into Notion blocks.
+
+Notion limits each rich_text object to 2000 characters counted in UTF-16
+code units (an emoji counts twice) and each block to 100 rich_text objects.
+Text is streamed once, line by line, and inline markdown (**bold**,
+*italic*, ~~strike~~, `code` and [links](https://...)) becomes rich_text
+annotations instead of literal markup.
+"""
+
+import re
+
+RICH_TEXT_LIMIT = 2000
+MAX_RICH_TEXT_ITEMS = 100
+
+_INLINE = re.compile(
+    r"\*\*(?P<bold>[^\n]+?)\*\*"
+    r"|__(?P<bold_alt>[^\n]+?)__"
+    r"|~~(?P<strikethrough>[^\n]+?)~~"
+    r"|`(?P<code>[^`\n]+)`"
+    r"|\[(?P<link>[^\]\n]+)\]\((?P<url>https?://[^)\s]+)\)"
+    r"|(?<![\w*])\*(?P<italic>[^*\s](?:[^*\n]*[^*\s])?)\*(?![\w*])"
+    r"|(?<![\w_])_(?P<italic_alt>[^_\s](?:[^_\n]*[^_\s])?)_(?![\w_])"
+)
+_GROUP_ANNOTATION = {
+    "bold": "bold",
+    "bold_alt": "bold",
+    "strikethrough": "strikethrough",
+    "code": "code",
+    "italic": "italic",
+    "italic_alt": "italic",
+}
+
+# (content, annotations, link url)
+Segment = tuple[str, frozenset[str], str | None]
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def parse_inline(
+    text: str, annotations: frozenset[str] = frozenset(), url: str | None = None
+) -> list[Segment]:
+    """Splits one line of markdown into annotated segments."""
+    segments = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            segments.append((text[position : match.start()], annotations, url))
+        group = match.lastgroup
+        if group == "url":
+            segments.extend(parse_inline(match["link"], annotations, match["url"]))
+        elif group == "code":
+            # No markdown inside code spans
+            segments.append((match["code"], annotations | {"code"}, url))
+        else:
+            segments.extend(
+                parse_inline(
+                    match[group], annotations | {_GROUP_ANNOTATION[group]}, url
+                )
+            )
+        position = match.end()
+    if position < len(text):
+        segments.append((text[position:], annotations, url))
+    return segments
+
+
+def _split_utf16(text: str, first: int, size: int) -> list[str]:
+    """
+    Cuts text into pieces of at most `first` and then `size` UTF-16 units,
+    never between the two halves of a surrogate pair.
+    """
+    data = text.encode("utf-16-le")
+    pieces = []
+    start = 0
+    limit = first
+    while start < len(data):
+        end = min(start + 2 * limit, len(data))
+        if end < len(data) and 0xD8 <= data[end - 1] <= 0xDB:
+            end -= 2
+        if end <= start:
+            # No room left for a surrogate pair; emit an empty piece so the
+            # caller starts a new block
+            pieces.append("")
+        else:
+            pieces.append(data[start:end].decode("utf-16-le"))
+            start = end
+        limit = size
+    return pieces
+
+
+def _rich_text_item(content: str, annotations: frozenset[str], url) -> dict:
+    text = {"content": content}
+    if url:
+        text["link"] = {"url": url}
+    item = {"type": "text", "text": text}
+    if annotations:
+        item["annotations"] = {name: True for name in sorted(annotations)}
+    return item
+
+
+def _block(block_type: str, segments: list[Segment]) -> dict:
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: {"rich_text": [_rich_text_item(*segment) for segment in segments]},
+    }
+
+
+class _BlockBuilder:
+    def __init__(self, block_type: str, max_block_length: int):
+        self.block_type = block_type
+        self.max_block_length = max_block_length
+        self.blocks: list[dict] = []
+        self.segments: list[Segment] = []
+        self.length = 0
+
+    def flush(self) -> None:
+        if self.segments:
+            self.blocks.append(_block(self.block_type, self.segments))
+        self.segments = []
+        self.length = 0
+
+    def _append(self, content: str, annotations: frozenset[str], url) -> None:
+        last = self.segments[-1] if self.segments else None
+        if last is not None and last[1] == annotations and last[2] == url:
+            self.segments[-1] = (last[0] + content, annotations, url)
+        else:
+            if len(self.segments) == MAX_RICH_TEXT_ITEMS:
+                self.flush()
+            self.segments.append((content, annotations, url))
+        self.length += utf16_len(content)
+
+    def add(self, segment: Segment) -> None:
+        content, annotations, url = segment
+        room = self.max_block_length - self.length
+        for index, piece in enumerate(
+            _split_utf16(content, room, self.max_block_length)
+        ):
+            if index:
+                self.flush()
+            if piece:
+                self._append(piece, annotations, url)
+
+    def add_line(self, segments: list[Segment]) -> None:
+        length = sum(utf16_len(segment[0]) for segment in segments)
+        if self.segments and self.length + 1 + length > self.max_block_length:
+            self.flush()
+        if self.segments:
+            self._append("\n", frozenset(), None)
+        for segment in segments:
+            self.add(segment)
+
+
+def text_blocks(
+    text: str,
+    block_type: str = "paragraph",
+    max_block_length: int = RICH_TEXT_LIMIT,
+    markdown: bool = True,
+) -> list[dict]:
+    """
+    Packs the non-empty lines of `text` into as few blocks as possible, each
+    holding at most `max_block_length` UTF-16 units; longer lines are split
+    across blocks. Runs in time linear in the length of the text.
+    """
+    builder = _BlockBuilder(block_type, min(max_block_length, RICH_TEXT_LIMIT))
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        builder.add_line(
+            parse_inline(line) if markdown else [(line, frozenset(), None)]
+        )
+    builder.flush()
+    return builder.blocks
+
+
+def rich_text_signature(rich_text: list[dict]) -> tuple:
+    """
+    Plain text plus annotations and links, comparable between blocks fetched
+    from Notion and blocks built here.
+    """
+    parts = []
+    for part in rich_text:
+        annotations = part.get("annotations") or {}
+        link = part.get("text", {}).get("link") or {}
+        parts.append(
+            (
+                part.get("plain_text", part.get("text", {}).get("content", "")),
+                tuple(sorted(name for name, on in annotations.items() if on is True)),
+                link.get("url"),
+            )
+        )
+    # Adjacent parts with equal formatting may be split differently
+    merged = []
+    for content, annotations, url in parts:
+        if merged and merged[-1][1:] == (annotations, url):
+            merged[-1] = (merged[-1][0] + content, annotations, url)
+        else:
+            merged.append((content, annotations, url))
+    return tuple(merged)
@@ -1,12 +1,79 @@
-import requests
+import difflib
+import hashlib
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime  # Import datetime
 from dotenv import load_dotenv
 from logger_utils import setup_logger
+from notion_blocks import rich_text_signature, text_blocks
+from notion_transport import NotionAPIError, NotionTransport
+from settings import Settings
 
-# from gemini_processor import GeminiProcessor # No longer needed
-from dspy_modules import ReadingNotes  # Import ReadingNotes
+# Notion accepts at most 100 blocks per children array and a 500KB request
+# body; stay a little under the byte limit for headers and properties.
+MAX_CHILDREN = 100
+MAX_PAYLOAD_BYTES = 450_000
+
+
+def _json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _error_code(error: NotionAPIError) -> str | None:
+    """The `code` field of a Notion error response, e.g. "validation_error"."""
+    try:
+        return json.loads(error.body).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _block_signature(block: dict) -> tuple:
+    """Type plus formatted text, comparable between fetched and built blocks."""
+    rich_text = block.get(block["type"], {}).get("rich_text", [])
+    return (block["type"], rich_text_signature(rich_text))
+
+
+def _encode_columns(
+    title: str, columns: list[list[dict]]
+) -> tuple[str, list[list[int]]]:
+    """
+    Serializes every block once, returning the upload key (a hash of the
+    title and all blocks) and each block's JSON size for request batching.
+    """
+    digest = hashlib.sha256(title.encode("utf-8"))
+    sizes = []
+    for blocks in columns:
+        column_sizes = []
+        for block in blocks:
+            encoded = json.dumps(block, ensure_ascii=False).encode("utf-8")
+            digest.update(b"\0")
+            digest.update(encoded)
+            column_sizes.append(len(encoded))
+        digest.update(b"\1")
+        sizes.append(column_sizes)
+    return digest.hexdigest(), sizes
+
+
+def _batches(blocks: list[dict], sizes: list[int] | None = None) -> list[list[dict]]:
+    batches = []
+    batch = []
+    batch_bytes = 0
+    if sizes is None:
+        sizes = [_json_size(block) for block in blocks]
+    for block, size in zip(blocks, sizes):
+        if batch and (
+            len(batch) == MAX_CHILDREN or batch_bytes + size > MAX_PAYLOAD_BYTES
+        ):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(block)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
 
 
 class NotionClient:
@@ -16,15 +83,24 @@ class NotionClient:
         database_id,
         reading_template_id: str = None,
         log_level_str: str = "WARNING",
+        transport: NotionTransport = None,
+        requests_per_second: float = 3,
+        upload_state_dir: str = "cache/uploads",
+        settings: Settings = None,
     ):
+        if settings is not None:
+            reading_template_id = reading_template_id or settings.reading_template_id
+            requests_per_second = settings.notion_requests_per_second
+            upload_state_dir = os.path.join(settings.cache_dir, "uploads")
         self.api_key = api_key
         self.database_id = database_id
         self.reading_template_id = reading_template_id
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
+        self.transport = transport or NotionTransport(
+            api_key,
+            requests_per_second=requests_per_second,
+            log_level_str=log_level_str,
+        )
+        self.upload_state_dir = upload_state_dir
         self.logger = setup_logger(__name__, log_level_str)
 
     def create_reading_page(
@@ -36,11 +112,226 @@ class NotionClient:
         notes: str = None,
         summary: str = None,
     ) -> dict:
-        create_page_url = "https://api.notion.com/v1/pages"
         current_date = datetime.now().isoformat()
 
-        column_list_children = []
+        column_1_blocks, column_2_blocks = self._build_columns(
+            key_points, notes, summary
+        )
+
+        properties = {
+            "notes": {"title": [{"text": {"content": title}}]},
+            "review level": {"select": {"name": "📖 reading"}},
+            "day": {"date": {"start": current_date}},
+        }
+
+        # Add subject and assignment if provided as IDs
+        if subject_id:
+            properties["subject"] = {"relation": [{"id": subject_id}]}
+        if assignment_id:
+            properties["assignments"] = {"relation": [{"id": assignment_id}]}
+
+        data = {
+            "parent": {"database_id": self.database_id},
+            "icon": {
+                "type": "external",
+                "external": {"url": "https://www.notion.so/icons/book_open_brown.svg"},
+            },  # Set the page icon to an external SVG
+            "properties": properties,
+        }
+        columns = [column_1_blocks, column_2_blocks]
+        upload_key, sizes = _encode_columns(title, columns)
+        state = self._load_upload_state(upload_key)
+        try:
+            if state is not None:
+                self.logger.info(
+                    "Resuming upload of %s into page %s", title, state["page_id"]
+                )
+                try:
+                    self._append_remaining(upload_key, state, columns, sizes)
+                except NotionAPIError as e:
+                    if not self._upload_is_stale(state, e):
+                        raise
+                    self.logger.warning(
+                        "Saved upload of %s into page %s is no longer usable "
+                        "(%s); starting a new page.",
+                        title,
+                        state["page_id"],
+                        e,
+                    )
+                    self._clear_upload_state(upload_key)
+                    state = None
+            if state is None:
+                state = self._create_skeleton(data, columns, sizes)
+                self._save_upload_state(upload_key, state)
+                self._append_remaining(upload_key, state, columns, sizes)
+            self._clear_upload_state(upload_key)
+            page_id = state["page_id"]
+            self.logger.info(
+                "Successfully created Notion page: %s with ID: %s", title, page_id
+            )
+            return {"page_id": page_id}
+        except NotionAPIError as e:
+            self.logger.error(f"Error creating Notion page: {e}")
+            if e.body:
+                self.logger.error(f"Notion API response: {e.body}")
+            raise
+
+    def find_page(self, title: str) -> str | None:
+        """Returns the id of the database page whose title equals `title`."""
+        response = self.transport.request(
+            "POST",
+            f"databases/{self.database_id}/query",
+            json={
+                "filter": {"property": "notes", "title": {"equals": title}},
+                "page_size": 1,
+            },
+        )
+        results = response.get("results", [])
+        return results[0]["id"] if results else None
 
+    def upsert_reading_page(
+        self,
+        title: str,
+        subject_id: str,
+        assignment_id: str,
+        key_points: list[str] = None,
+        notes: str = None,
+        summary: str = None,
+        page_id: str = None,
+    ) -> dict:
+        """
+        Updates an existing reading page in place, or creates it if none is
+        found. `page_id` (e.g. from the run manifest) is tried first, then a
+        database query by title. Only blocks that differ from the new notes
+        are updated, inserted or deleted. Raises NotionAPIError, or
+        ValueError when the page does not have the reading page layout.
+        """
+        try:
+            page_id = page_id or self.find_page(title)
+            if page_id is None:
+                return self.create_reading_page(
+                    title, subject_id, assignment_id, key_points, notes, summary
+                )
+            column_ids = self._column_ids(page_id)
+            operations = 0
+            for column_id, blocks in zip(
+                column_ids, self._build_columns(key_points, notes, summary)
+            ):
+                operations += self._sync_column(
+                    column_id,
+                    blocks or [self._create_block_with_rich_text("paragraph", "")],
+                )
+            self.logger.info(
+                "Updated Notion page: %s with ID: %s (%d block operations)",
+                title,
+                page_id,
+                operations,
+            )
+            return {"page_id": page_id, "operations": operations}
+        except NotionAPIError as e:
+            self.logger.error(f"Error updating Notion page {title}: {e}")
+            if e.body:
+                self.logger.error(f"Notion API response: {e.body}")
+            raise
+        except (StopIteration, KeyError) as e:
+            raise ValueError(
+                f"Notion page {page_id} does not have the reading page layout"
+            ) from e
+
+    def _sync_column(self, column_id: str, desired: list[dict]) -> int:
+        """
+        Applies a block-level diff of `desired` against the column's current
+        children and returns the number of API calls made.
+        """
+        existing = self._list_children(column_id)
+        opcodes = difflib.SequenceMatcher(
+            a=[_block_signature(block) for block in existing],
+            b=[_block_signature(block) for block in desired],
+            autojunk=False,
+        ).get_opcodes()
+        if existing and any(
+            i1 == 0
+            and (
+                tag == "insert"
+                or (tag == "replace" and existing[0]["type"] != desired[j1]["type"])
+            )
+            for tag, i1, _, j1, _ in opcodes
+        ):
+            # Notion only inserts after an existing block, so new blocks at
+            # the very top mean rewriting the column
+            return self._rewrite_column(column_id, existing, desired)
+
+        operations = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                continue
+            old = existing[i1:i2]
+            new = desired[j1:j2]
+            paired = 0
+            if tag == "replace":
+                for old_block, new_block in zip(old, new):
+                    if old_block["type"] != new_block["type"]:
+                        break
+                    self.transport.request(
+                        "PATCH",
+                        f"blocks/{old_block['id']}",
+                        json={new_block["type"]: new_block[new_block["type"]]},
+                    )
+                    operations += 1
+                    paired += 1
+            for old_block in old[paired:]:
+                self.transport.request("DELETE", f"blocks/{old_block['id']}")
+                operations += 1
+            if new[paired:]:
+                after = old[paired - 1]["id"] if paired else None
+                if after is None and i1 > 0:
+                    after = existing[i1 - 1]["id"]
+                operations += self._insert_blocks(column_id, new[paired:], after)
+        return operations
+
+    def _rewrite_column(
+        self, column_id: str, existing: list[dict], desired: list[dict]
+    ) -> int:
+        # Append first so the column is never empty, then drop the old blocks
+        operations = self._insert_blocks(column_id, desired, None)
+        for block in existing:
+            self.transport.request("DELETE", f"blocks/{block['id']}")
+            operations += 1
+        return operations
+
+    def _insert_blocks(
+        self, parent_id: str, blocks: list[dict], after: str | None
+    ) -> int:
+        operations = 0
+        for batch in _batches(blocks):
+            payload = {"children": batch}
+            if after is not None:
+                payload["after"] = after
+            response = self.transport.request(
+                "PATCH", f"blocks/{parent_id}/children", json=payload
+            )
+            operations += 1
+            if after is not None:
+                # Later batches go after the last block just inserted
+                after = response["results"][-1]["id"]
+        return operations
+
+    def _list_children(self, block_id: str) -> list[dict]:
+        children = []
+        cursor = None
+        while True:
+            path = f"blocks/{block_id}/children?page_size=100"
+            if cursor:
+                path += f"&start_cursor={cursor}"
+            response = self.transport.request("GET", path)
+            children.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return children
+            cursor = response.get("next_cursor")
+
+    def _build_columns(
+        self, key_points: list[str] = None, notes: str = None, summary: str = None
+    ) -> list[list[dict]]:
         # Column 1: Key Points
         column_1_blocks = []
         if key_points:
@@ -56,22 +347,7 @@ class NotionClient:
                 }
             )
             for point in key_points:
-                column_1_blocks.append(
-                    {
-                        "object": "block",
-                        "type": "bulleted_list_item",
-                        "bulleted_list_item": {
-                            "rich_text": [{"type": "text", "text": {"content": point}}]
-                        },
-                    }
-                )
-        column_list_children.append(
-            {
-                "object": "block",
-                "type": "column",
-                "column": {"children": column_1_blocks},
-            }
-        )
+                column_1_blocks.extend(text_blocks(point, "bulleted_list_item"))
 
         # Column 2: Summary and Notes
         column_2_blocks = []
@@ -97,57 +373,147 @@ class NotionClient:
                 }
             )
             column_2_blocks.extend(self._split_text_into_blocks(notes, "paragraph"))
-        column_list_children.append(
-            {
-                "object": "block",
-                "type": "column",
-                "column": {"children": column_2_blocks},
-            }
-        )
 
-        # Main children blocks for the page
-        children_blocks = [
-            {
-                "object": "block",
-                "type": "column_list",
-                "column_list": {"children": column_list_children},
-            }
-        ]
+        return [column_1_blocks, column_2_blocks]
 
-        properties = {
-            "notes": {"title": [{"text": {"content": title}}]},
-            "review level": {"select": {"name": "📖 reading"}},
-            "day": {"date": {"start": current_date}},
+    def _create_skeleton(
+        self, data: dict, columns: list[list[dict]], sizes: list[list[int]]
+    ) -> dict:
+        """
+        Phase one: creates the page with as much of each column as fits in a
+        single request. Returns the upload state for the remaining blocks.
+        """
+        budget = MAX_PAYLOAD_BYTES - _json_size(data)
+        column_blocks = []
+        acked = []
+        for blocks, block_sizes in zip(columns, sizes):
+            prefix = []
+            for block, size in zip(blocks[:MAX_CHILDREN], block_sizes):
+                if size > budget:
+                    break
+                budget -= size
+                prefix.append(block)
+            # Notion rejects columns without children
+            column_blocks.append(
+                prefix or [self._create_block_with_rich_text("paragraph", "")]
+            )
+            acked.append(len(prefix))
+        data = {
+            **data,
+            "children": [
+                {
+                    "object": "block",
+                    "type": "column_list",
+                    "column_list": {
+                        "children": [
+                            {
+                                "object": "block",
+                                "type": "column",
+                                "column": {"children": blocks},
+                            }
+                            for blocks in column_blocks
+                        ]
+                    },
+                }
+            ],
         }
+        page_id = self.transport.request("POST", "pages", json=data).get("id")
+        return {"page_id": page_id, "column_ids": None, "acked": acked}
 
-        # Add subject and assignment if provided as IDs
-        if subject_id:
-            properties["subject"] = {"relation": [{"id": subject_id}]}
-        if assignment_id:
-            properties["assignments"] = {"relation": [{"id": assignment_id}]}
+    def _append_remaining(
+        self,
+        upload_key: str,
+        state: dict,
+        columns: list[list[dict]],
+        sizes: list[list[int]],
+    ) -> None:
+        """
+        Phase two: appends the blocks that did not fit in the skeleton. Each
+        column is appended in order, in batches within Notion's children and
+        payload limits; the two columns are uploaded concurrently. Progress is
+        saved after every acknowledged batch so a failed upload resumes there.
+        """
+        if all(acked >= len(blocks) for acked, blocks in zip(state["acked"], columns)):
+            return
+        if state["column_ids"] is None:
+            state["column_ids"] = self._column_ids(state["page_id"])
+            self._save_upload_state(upload_key, state)
+        state_lock = threading.Lock()
 
-        data = {
-            "parent": {"database_id": self.database_id},
-            "icon": {
-                "type": "external",
-                "external": {"url": "https://www.notion.so/icons/book_open_brown.svg"},
-            },  # Set the page icon to an external SVG
-            "properties": properties,
-            "children": children_blocks,
-        }
+        def upload_column(index: int) -> None:
+            acked = state["acked"][index]
+            for batch in _batches(columns[index][acked:], sizes[index][acked:]):
+                self.transport.request(
+                    "PATCH",
+                    f"blocks/{state['column_ids'][index]}/children",
+                    json={"children": batch},
+                )
+                with state_lock:
+                    state["acked"][index] += len(batch)
+                    self._save_upload_state(upload_key, state)
+
+        with ThreadPoolExecutor(max_workers=len(columns)) as executor:
+            for future in [
+                executor.submit(upload_column, index) for index in range(len(columns))
+            ]:
+                future.result()
+
+    def _upload_is_stale(self, state: dict, error: NotionAPIError) -> bool:
+        """
+        True when a resumed upload failed because its saved page or columns
+        were deleted or archived since, rather than because Notion rejected
+        the content; only then may the saved state be dropped.
+        """
+        if error.status_code == 404 or _error_code(error) == "object_not_found":
+            return True
+        if error.status_code != 400:
+            return False
+        paths = [f"pages/{state['page_id']}"] + [
+            f"blocks/{column_id}" for column_id in state["column_ids"] or []
+        ]
+        for path in paths:
+            try:
+                block = self.transport.request("GET", path)
+            except NotionAPIError as e:
+                if e.status_code == 404:
+                    return True
+                raise
+            if block.get("archived") or block.get("in_trash"):
+                return True
+        return False
+
+    def _column_ids(self, page_id: str) -> list[str]:
+        page_children = self.transport.request("GET", f"blocks/{page_id}/children")
+        column_list_id = next(
+            block["id"]
+            for block in page_children["results"]
+            if block["type"] == "column_list"
+        )
+        columns = self.transport.request("GET", f"blocks/{column_list_id}/children")
+        return [block["id"] for block in columns["results"]]
+
+    def _upload_state_path(self, upload_key: str) -> str:
+        return os.path.join(self.upload_state_dir, f"{upload_key}.json")
+
+    def _load_upload_state(self, upload_key: str) -> dict | None:
         try:
-            response = requests.post(create_page_url, headers=self.headers, json=data)
-            response.raise_for_status()
-            page_id = response.json().get("id")
-            self.logger.info(
-                f"Successfully created Notion page: {title} with ID: {page_id}"
-            )
-            return {"page_id": page_id}
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error creating Notion page: {e}")
-            if response is not None:
-                self.logger.error(f"Notion API response: {response.text}")
-            return {"error": str(e)}
+            with open(self._upload_state_path(upload_key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_upload_state(self, upload_key: str, state: dict) -> None:
+        os.makedirs(self.upload_state_dir, exist_ok=True)
+        path = self._upload_state_path(upload_key)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _clear_upload_state(self, upload_key: str) -> None:
+        try:
+            os.remove(self._upload_state_path(upload_key))
+        except FileNotFoundError:
+            pass
 
     def _create_heading_block(self, content: str, level: int) -> dict:
         heading_type = f"heading_{level}"
@@ -162,63 +528,8 @@ class NotionClient:
     def _split_text_into_blocks(
         self, text: str, block_type: str = "paragraph", max_block_length: int = 2000
     ) -> list:
-        blocks = []
-        current_block_paragraphs = []  # Store paragraphs for the current block
-
-        # Split text by actual newlines
-        paragraphs = text.split("\n")
-
-        for paragraph in paragraphs:
-            if not paragraph.strip():
-                continue
-
-            # If a single paragraph is too long, split it into smaller chunks
-            if len(paragraph) > max_block_length:
-                # Flush any existing content before adding chunks of a very long paragraph
-                if current_block_paragraphs:
-                    blocks.append(
-                        self._create_block_with_rich_text(
-                            block_type, "\n".join(current_block_paragraphs)
-                        )
-                    )
-                    current_block_paragraphs = []
-
-                # Split the long paragraph into chunks and add them as individual blocks
-                for i in range(0, len(paragraph), max_block_length):
-                    chunk = paragraph[i : i + max_block_length]
-                    blocks.append(self._create_block_with_rich_text(block_type, chunk))
-                continue  # Move to the next paragraph
-
-            # Calculate the length if the current paragraph were added to the current block
-            # Account for the newline character that will be added if there are multiple paragraphs
-            potential_block_content = "\n".join(current_block_paragraphs + [paragraph])
-
-            # If adding this paragraph makes the current block too long,
-            # flush the current block and start a new one
-            if (
-                len(potential_block_content) > max_block_length
-                and current_block_paragraphs
-            ):
-                blocks.append(
-                    self._create_block_with_rich_text(
-                        block_type, "\n".join(current_block_paragraphs)
-                    )
-                )
-                current_block_paragraphs = [
-                    paragraph
-                ]  # Start new block with current paragraph
-            else:
-                current_block_paragraphs.append(paragraph)
-
-        # Add any remaining content in current_block_paragraphs
-        if current_block_paragraphs:
-            blocks.append(
-                self._create_block_with_rich_text(
-                    block_type, "\n".join(current_block_paragraphs)
-                )
-            )
-
-        return blocks
+        # Lengths are in UTF-16 units, the way Notion counts them
+        return text_blocks(text, block_type, max_block_length)
 
     def _create_block_with_rich_text(self, block_type: str, content: str) -> dict:
         return {
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from logger_utils import setup_logger
+from rate_limiter import TokenBucket
+from metrics import percentile
+
+NOTION_API_URL = "https://api.notion.com/v1"
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+# Statuses that guarantee Notion did not apply a request, so even a write
+# that is not idempotent (creating a page, appending children) can be resent
+NOT_APPLIED_STATUS = {409, 429}
+
+
+class NotionAPIError(Exception):
+    def __init__(self, message: str, status_code: int | None = None, body: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class NotionTransport:
+    """
+    Shared HTTP layer for the Notion API.
+
+    Requests go through one pooled keep-alive session and a token bucket
+    sized to Notion's average limit of about 3 requests per second. 429,
+    409 (conflict) and 5xx responses, as well as connection errors and
+    timeouts, are retried with jittered exponential backoff, honouring
+    Retry-After when Notion sends it. Page creation and children appends are
+    not idempotent: a read timeout or 5xx may come after Notion applied them,
+    so they are only retried when the request provably was not applied
+    (could not connect, 429 or 409). Every attempt's latency is recorded.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        requests_per_second: float = 3,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        timeout: float = 60,
+        pool_size: int = 10,
+        base_url: str = NOTION_API_URL,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Notion-Version": "2022-06-28",
+            }
+        )
+        self.limiter = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.latencies: list[tuple[str, int | None, float]] = []
+        self.retries = 0
+        self.metrics_lock = threading.Lock()
+
+    @staticmethod
+    def _idempotent(method: str, path: str) -> bool:
+        path = path.rstrip("/")
+        if method == "POST":
+            # Database queries are reads; every other POST creates something
+            return path.endswith("/query")
+        if method == "PATCH":
+            return not path.endswith("/children")
+        return True
+
+    @staticmethod
+    def _not_sent(error: requests.RequestException) -> bool:
+        """True when the request failed before reaching Notion."""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def request(self, method: str, path: str, json: dict | None = None) -> dict:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        idempotent = self._idempotent(method, path)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, json=json, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(method, None, time.perf_counter() - started)
+                if attempt == self.max_retries or not (idempotent or self._not_sent(e)):
+                    raise NotionAPIError(f"{method} {path} failed: {e}") from e
+                self._sleep(attempt, None)
+                continue
+            self._record(method, response.status_code, time.perf_counter() - started)
+            if response.ok:
+                return response.json()
+            retryable = RETRYABLE_STATUS if idempotent else NOT_APPLIED_STATUS
+            if response.status_code not in retryable or attempt == self.max_retries:
+                raise NotionAPIError(
+                    f"{method} {path} returned {response.status_code}",
+                    status_code=response.status_code,
+                    body=response.text,
+                )
+            self._sleep(attempt, response.headers.get("Retry-After"))
+        raise NotionAPIError(f"{method} {path} exhausted retries")
+
+    def _sleep(self, attempt: int, retry_after: str | None) -> None:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        with self.metrics_lock:
+            self.retries += 1
+        self.logger.warning("Retrying Notion request in %.2fs", delay)
+        time.sleep(delay)
+
+    def _record(self, method: str, status: int | None, seconds: float) -> None:
+        with self.metrics_lock:
+            self.latencies.append((method, status, seconds))
+
+    def stats(self) -> dict:
+        with self.metrics_lock:
+            latencies = sorted(seconds for _, _, seconds in self.latencies)
+            retries = self.retries
+        if not latencies:
+            return {"requests": 0, "retries": retries}
+        return {
+            "requests": len(latencies),
+            "retries": retries,
+            "p50_seconds": percentile(latencies, 0.5),
+            "p95_seconds": percentile(latencies, 0.95),
+            "max_seconds": latencies[-1],
+        }
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,291 @@
+import hashlib
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+
+from pydantic import BaseModel
+from pypdf import PdfReader
+from extraction_backends import (
+    BackendSelection,
+    ExtractionBackend,
+    PypdfBackend,
+    calibrate,
+    open_backend,
+)
+from run_manifest import hash_file
+from text_preprocessing import preprocess_pages
+
+
+class PageText(BaseModel):
+    index: int
+    text: str
+    seconds: float
+    cached: bool = False
+
+
+class ExtractionReport(BaseModel):
+    text: str
+    pages: int
+    cached_pages: int
+    seconds: float
+    slowest_pages: list[tuple[int, float]]
+    page_offsets: list[int] = []
+    outline: list[tuple[str, int]] = []
+    raw_chars: int = 0
+    removed_lines: int = 0
+    backend: str = PypdfBackend.name
+
+
+def outline_sections(reader: PdfReader) -> list[tuple[str, int]]:
+    """Returns (title, start page index) for each top-level outline entry."""
+    sections = []
+    try:
+        for entry in reader.outline:
+            # Nested lists hold sub-sections of the preceding entry
+            if isinstance(entry, list):
+                continue
+            page_index = reader.get_destination_page_number(entry)
+            if page_index is not None and page_index >= 0:
+                sections.append((str(entry.title).strip(), page_index))
+    except Exception:
+        return []
+    return sorted(sections, key=lambda section: section[1])
+
+
+def page_digest(page) -> str:
+    """
+    Hashes what determines a page's extracted text: its content stream and
+    the fonts it references. Pages untouched by an edit keep their digest even
+    though the file hash changes.
+    """
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources else None
+    if fonts:
+        for name, font in sorted(fonts.get_object().items()):
+            digest.update(name.encode("utf-8"))
+            digest.update(str(font.get_object().get("/BaseFont")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PageTextCache:
+    """
+    SQLite cache of extracted page text.
+
+    Lookups go by (file hash, page index) first, so an unchanged file never
+    has its pages parsed. On a miss the page content digest is tried, so
+    after a small edit only the pages that actually changed are re-extracted.
+    New pages are buffered and written in short transactions of
+    `batch_pages` pages, so parallel extraction workers never hold the
+    write lock while a page is being parsed.
+    """
+
+    def __init__(self, cache_dir: str = "cache", batch_pages: int = 32):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(
+            os.path.join(cache_dir, "page_text.sqlite"), timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS page_text "
+            "(digest TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_pages (file_hash TEXT NOT NULL, "
+            "page_index INTEGER NOT NULL, digest TEXT NOT NULL, "
+            "PRIMARY KEY (file_hash, page_index))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS backend_selection "
+            "(file_hash TEXT PRIMARY KEY, selection TEXT NOT NULL, "
+            "measured_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.batch_pages = batch_pages
+        self.pending: list[tuple[str, int, str, str]] = []
+
+    def get_by_position(self, file_hash: str, page_index: int) -> str | None:
+        row = self.conn.execute(
+            "SELECT t.text FROM file_pages f JOIN page_text t ON t.digest = f.digest "
+            "WHERE f.file_hash = ? AND f.page_index = ?",
+            (file_hash, page_index),
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_by_digest(self, digest: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT text FROM page_text WHERE digest = ?", (digest,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, file_hash: str, page_index: int, digest: str, text: str) -> None:
+        self.pending.append((file_hash, page_index, digest, text))
+        if len(self.pending) >= self.batch_pages:
+            self.commit()
+
+    def get_selection(self, file_hash: str) -> BackendSelection | None:
+        row = self.conn.execute(
+            "SELECT selection FROM backend_selection WHERE file_hash = ?",
+            (file_hash,),
+        ).fetchone()
+        return BackendSelection.model_validate_json(row[0]) if row else None
+
+    def put_selection(self, file_hash: str, selection: BackendSelection) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO backend_selection "
+            "(file_hash, selection, measured_at) VALUES (?, ?, ?)",
+            (file_hash, selection.model_dump_json(), time.time()),
+        )
+        self.conn.commit()
+
+    def commit(self) -> None:
+        """Writes the buffered pages in one transaction."""
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO page_text (digest, text) VALUES (?, ?)",
+                [(digest, text) for _, _, digest, text in self.pending],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_pages (file_hash, page_index, digest) "
+                "VALUES (?, ?, ?)",
+                [
+                    (file_hash, index, digest)
+                    for file_hash, index, digest, _ in self.pending
+                ],
+            )
+        self.pending = []
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _page_text(
+    page,
+    index: int,
+    file_hash: str | None,
+    cache: PageTextCache | None,
+    backend: ExtractionBackend,
+) -> tuple[str, bool]:
+    if cache is None:
+        return backend.page_text(index), False
+    # Text differs between backends, so only pypdf uses the bare keys
+    prefix = "" if backend.name == PypdfBackend.name else f"{backend.name}:"
+    text = cache.get_by_position(prefix + file_hash, index)
+    if text is not None:
+        return text, True
+    digest = prefix + page_digest(page)
+    text = cache.get_by_digest(digest)
+    cached = text is not None
+    if not cached:
+        text = backend.page_text(index)
+    cache.put(prefix + file_hash, index, digest, text)
+    return text, cached
+
+
+def iter_pages(
+    pdf_file: str,
+    cache: PageTextCache | None = None,
+    reader: PdfReader | None = None,
+    backend: str = PypdfBackend.name,
+    file_hash: str | None = None,
+) -> Iterator[PageText]:
+    """
+    Yields the text of each page lazily, consulting the page cache first.
+    Text comes from the named backend; pypdf is still used for page digests.
+    """
+    reader = reader or PdfReader(pdf_file)
+    if cache is not None and file_hash is None:
+        file_hash = hash_file(pdf_file)
+    extractor = open_backend(backend, pdf_file, reader)
+    try:
+        for index, page in enumerate(reader.pages):
+            started = time.perf_counter()
+            text, cached = _page_text(page, index, file_hash, cache, extractor)
+            yield PageText(
+                index=index,
+                text=text,
+                seconds=time.perf_counter() - started,
+                cached=cached,
+            )
+    finally:
+        extractor.close()
+        if cache is not None:
+            cache.commit()
+
+
+def extract_pdf_text(
+    pdf_file: str,
+    cache_dir: str | None = "cache",
+    slowest: int = 5,
+    preprocess: bool = False,
+    backend: str = PypdfBackend.name,
+) -> ExtractionReport:
+    """
+    Extracts a whole PDF in linear time (pages are joined once) and reports
+    per-page timings, page start offsets and the outline. With `preprocess`,
+    repeated headers/footers, page numbers, hyphenation and extra whitespace
+    are stripped (see text_preprocessing). `backend` names an extraction
+    backend, or "auto" to calibrate the installed ones on this file (the
+    choice is remembered in the page cache). Safe to run in a worker process.
+    """
+    cache = PageTextCache(cache_dir) if cache_dir else None
+    started = time.perf_counter()
+    reader = PdfReader(pdf_file)
+    file_hash = hash_file(pdf_file) if cache is not None else None
+    if backend == "auto":
+        backend = _select_backend(pdf_file, reader, cache, file_hash)
+    texts = []
+    timings = []
+    page_offsets = []
+    offset = 0
+    cached_pages = 0
+    try:
+        for page in iter_pages(pdf_file, cache, reader, backend, file_hash):
+            page_offsets.append(offset)
+            offset += len(page.text)
+            texts.append(page.text)
+            timings.append((page.index, page.seconds))
+            cached_pages += page.cached
+    finally:
+        if cache is not None:
+            cache.close()
+    text = "".join(texts)
+    raw_chars = len(text)
+    removed_lines = 0
+    if preprocess:
+        cleaned = preprocess_pages(texts)
+        text = cleaned.text
+        page_offsets = cleaned.page_offsets
+        removed_lines = cleaned.removed_lines
+    return ExtractionReport(
+        text=text,
+        pages=len(texts),
+        cached_pages=cached_pages,
+        seconds=time.perf_counter() - started,
+        slowest_pages=sorted(timings, key=lambda item: item[1], reverse=True)[:slowest],
+        page_offsets=page_offsets,
+        outline=outline_sections(reader),
+        raw_chars=raw_chars,
+        removed_lines=removed_lines,
+        backend=backend,
+    )
+
+
+def _select_backend(
+    pdf_file: str,
+    reader: PdfReader,
+    cache: PageTextCache | None,
+    file_hash: str | None,
+) -> str:
+    selection = cache.get_selection(file_hash) if cache is not None else None
+    if selection is None:
+        selection = calibrate(pdf_file, reader=reader)
+        if cache is not None:
+            cache.put_selection(file_hash, selection)
+    return selection.backend
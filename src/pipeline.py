@@ -0,0 +1,485 @@
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from pydantic import BaseModel
+from logger_utils import setup_logger
+from pdf_extraction import extract_pdf_text
+from dspy_modules import ReadingNotes
+from chunking import CHARS_PER_TOKEN, estimate_tokens, split_into_chunks
+from metrics import current_document, tracer
+from similarity_index import DuplicateMatch, estimate_similarity, minhash_sketch
+from stage_checkpoints import EXTRACT, LLM, extract_to_checkpoint
+
+_DONE = object()
+
+
+class DocumentResult(BaseModel):
+    pdf_file: str
+    title: str
+    page_id: str | None = None
+    error: str | None = None
+    duplicate_of: str | None = None
+
+
+class _InFlight:
+    """A document being summarized; near-duplicates in the same run wait on it."""
+
+    def __init__(self, pdf_file: str, sketch: list[int]):
+        self.pdf_file = pdf_file
+        self.sketch = sketch
+        self.notes: ReadingNotes | None = None
+        self.done = threading.Event()
+
+
+class ReadingPipeline:
+    """
+    Runs extract -> LLM -> Notion as three overlapping stages.
+
+    Extraction runs in a process pool, GeminiProcessor calls run on
+    `llm_concurrency` threads and Notion pages are created by a single
+    writer (NotionClient's transport enforces the Notion rate limit). Stages
+    are connected by bounded queues, so a slow downstream stage stops
+    upstream work from piling up in memory.
+    Pages are created, and results returned, in input order; a failure in any
+    stage only affects its own document and is recorded in `dead_letters`
+    (a DeadLetterQueue) when one is given. With `checkpoints` (a
+    CheckpointStore) each stage's output is persisted per document: only
+    file names travel through the queues, a restarted run resumes every
+    document after its last completed stage, and memory stays flat however
+    many documents are queued. The extraction pool is kept between run()
+    calls; call close() when done.
+    """
+
+    def __init__(
+        self,
+        gemini_processor,
+        notion_client,
+        subject_id: str,
+        assignment_id: str,
+        manifest=None,
+        extract_workers: int = 4,
+        llm_concurrency: int = 4,
+        queue_size: int = 8,
+        cache_dir: str | None = "cache",
+        max_chunk_tokens: int = 30000,
+        upsert: bool = False,
+        refresh: bool = False,
+        preprocess: bool = True,
+        similarity_index=None,
+        extraction_backend: str = "pypdf",
+        dead_letters=None,
+        checkpoints=None,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.gemini_processor = gemini_processor
+        self.notion_client = notion_client
+        self.subject_id = subject_id
+        self.assignment_id = assignment_id
+        self.manifest = manifest
+        self.extract_workers = extract_workers
+        self.llm_concurrency = llm_concurrency
+        self.queue_size = queue_size
+        self.cache_dir = cache_dir
+        self.max_chunk_tokens = max_chunk_tokens
+        self.upsert = upsert
+        # Update pages recorded in the manifest in place even without upsert
+        self.refresh = refresh
+        self.preprocess = preprocess
+        self.similarity_index = similarity_index
+        self.extraction_backend = extraction_backend
+        self.dead_letters = dead_letters
+        self.checkpoints = checkpoints
+        # Checkpointed text is only reused if it was extracted the same way
+        self.extract_config = f"{extraction_backend}:preprocess={preprocess}"
+        self._pool: ProcessPoolExecutor | None = None
+        # Per run: documents being summarized, and the page each group of
+        # near-duplicates was published to (writer thread only)
+        self._in_flight: list[_InFlight] = []
+        self._in_flight_lock = threading.Lock()
+        self._batch_pages: dict[str, tuple[str, str]] = {}
+
+    def _extract_pool(self) -> ProcessPoolExecutor:
+        # Kept across run() calls so watch mode reuses warm worker processes
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        return self._pool
+
+    def _submit(self, fn, *args, **kwargs) -> Future:
+        try:
+            return self._extract_pool().submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, crash in a PDF library): the documents
+            # it had queued fail, later ones get a fresh pool
+            self.logger.warning("Extraction pool is broken; starting a new one.")
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            return self._extract_pool().submit(fn, *args, **kwargs)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run(self, pdf_files: list[str]) -> list[DocumentResult]:
+        results: list[DocumentResult | None] = [None] * len(pdf_files)
+        if not pdf_files:
+            return []
+        self._in_flight = []
+        self._batch_pages = {}
+        extracted: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        summarized: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        feeder = threading.Thread(
+            target=self._feed, args=(pdf_files, extracted), daemon=True
+        )
+        llm_workers = [
+            threading.Thread(
+                target=self._summarize, args=(extracted, summarized), daemon=True
+            )
+            for _ in range(self.llm_concurrency)
+        ]
+        writer = threading.Thread(
+            target=self._publish,
+            args=(summarized, len(pdf_files), results),
+            daemon=True,
+        )
+        for thread in [feeder, *llm_workers, writer]:
+            thread.start()
+        feeder.join()
+        for thread in llm_workers:
+            thread.join()
+        writer.join()
+
+        return results
+
+    def _resume_stage(self, pdf_file: str) -> str | None:
+        if self.checkpoints is not None:
+            stage = self.checkpoints.completed_stage(pdf_file, self.extract_config)
+            if stage is not None:
+                return stage
+        # Notes kept from an attempt where only the Notion stage failed
+        if self.dead_letters is not None and self.dead_letters.notes(pdf_file):
+            return LLM
+        return None
+
+    def _saved_notes(self, pdf_file: str) -> ReadingNotes | None:
+        if self.checkpoints is not None:
+            notes = self.checkpoints.notes(pdf_file)
+            if notes is not None:
+                return notes
+        saved = self.dead_letters.notes(pdf_file) if self.dead_letters else None
+        return ReadingNotes.model_validate(saved) if saved is not None else None
+
+    def _feed(self, pdf_files: list[str], extracted: queue.Queue) -> None:
+        try:
+            for index, pdf_file in enumerate(pdf_files):
+                try:
+                    resume, future = self._start(pdf_file)
+                except Exception as e:
+                    # Handed on as a failed extraction, so the document still
+                    # gets its result and dead letter
+                    resume, future = None, Future()
+                    future.set_exception(e)
+                # Blocks once queue_size documents are waiting for the LLM stage
+                extracted.put((index, pdf_file, future, resume))
+        finally:
+            for _ in range(self.llm_concurrency):
+                extracted.put(_DONE)
+
+    def _start(self, pdf_file: str) -> tuple[str | None, Future | None]:
+        resume = self._resume_stage(pdf_file)
+        if resume is not None:
+            return resume, None
+        if self.checkpoints is not None:
+            # The worker writes the text to the checkpoint store instead of
+            # sending it back through the queue
+            return None, self._submit(
+                extract_to_checkpoint,
+                pdf_file,
+                self.checkpoints.path,
+                self.extract_config,
+                self.cache_dir,
+                preprocess=self.preprocess,
+                backend=self.extraction_backend,
+            )
+        return None, self._submit(
+            extract_pdf_text,
+            pdf_file,
+            self.cache_dir,
+            preprocess=self.preprocess,
+            backend=self.extraction_backend,
+        )
+
+    def _summarize(self, extracted: queue.Queue, summarized: queue.Queue) -> None:
+        while True:
+            item = extracted.get()
+            if item is _DONE:
+                return
+            index, pdf_file, future, resume = item
+            token = current_document.set(pdf_file)
+            stage = "extract"
+            in_flight = None
+            try:
+                if resume is not None and resume != EXTRACT:
+                    self.logger.info(
+                        "Resuming %s after the %s stage.", pdf_file, resume
+                    )
+                    summarized.put((index, pdf_file, None, None, None, None))
+                    continue
+                if resume == EXTRACT:
+                    self.logger.info("Resuming %s from extracted text.", pdf_file)
+                    extraction = self.checkpoints.extraction(pdf_file)
+                else:
+                    extraction = future.result()
+                    if self.checkpoints is not None:
+                        # Read back only now that an LLM worker is free
+                        extraction = self.checkpoints.extraction(pdf_file)
+                    self._record_extraction(pdf_file, extraction)
+                stage = "llm"
+                sketch = match = leader = None
+                if self.similarity_index is not None:
+                    with tracer.span("dedupe") as span:
+                        sketch = minhash_sketch(extraction.text)
+                        match, leader, in_flight = self._claim(pdf_file, sketch)
+                        span["duplicate"] = match is not None or leader is not None
+                    if match is None and leader is not None:
+                        match = self._await_leader(pdf_file, sketch, leader)
+                if match is not None:
+                    self.logger.info(
+                        "%s matches %s (similarity %.2f); reusing its notes.",
+                        pdf_file,
+                        match.pdf_file,
+                        match.similarity,
+                    )
+                    notes = match.notes
+                else:
+                    self.logger.info("Summarizing PDF file: %s", pdf_file)
+                    chunks = split_into_chunks(
+                        extraction.text,
+                        extraction.page_offsets,
+                        extraction.outline,
+                        self.max_chunk_tokens,
+                    )
+                    notes = self.gemini_processor.process_chunks(chunks)
+                    if in_flight is not None:
+                        in_flight.notes = notes
+                del extraction
+                if self.checkpoints is not None:
+                    self.checkpoints.put_notes(pdf_file, notes)
+                    # The writer reads the notes back when it gets to them
+                    notes = None
+                summarized.put((index, pdf_file, notes, None, sketch, match))
+            except Exception as e:
+                self.logger.error(f"Error processing {pdf_file}: {e}")
+                summarized.put((index, pdf_file, None, (stage, e), None, None))
+            finally:
+                if in_flight is not None:
+                    in_flight.done.set()
+                current_document.reset(token)
+
+    def _claim(
+        self, pdf_file: str, sketch: list[int]
+    ) -> tuple[DuplicateMatch | None, _InFlight | None, _InFlight | None]:
+        """
+        Returns (match, None, None) for a published near-duplicate, (None,
+        leader, None) when one is still being summarized in this run, and
+        otherwise registers the document so later copies wait for it
+        (None, None, entry). The index lookup happens under the lock, so a
+        leader released by the writer is always found in one or the other.
+        """
+        with self._in_flight_lock:
+            match = self.similarity_index.find(sketch, pdf_file)
+            if match is not None:
+                return match, None, None
+            scored = [
+                (estimate_similarity(sketch, entry.sketch), entry)
+                for entry in self._in_flight
+            ]
+            similarity, best = max(scored, key=lambda pair: pair[0], default=(0, None))
+            if best is not None and similarity >= self.similarity_index.threshold:
+                return None, best, None
+            entry = _InFlight(pdf_file, sketch)
+            self._in_flight.append(entry)
+            return None, None, entry
+
+    def _release(self, pdf_file: str) -> None:
+        """
+        Drops a leader, and its notes, once the writer is done with it; a
+        published leader is in the similarity index by then.
+        """
+        with self._in_flight_lock:
+            self._in_flight = [
+                entry for entry in self._in_flight if entry.pdf_file != pdf_file
+            ]
+
+    def _await_leader(
+        self, pdf_file: str, sketch: list[int], leader: _InFlight
+    ) -> DuplicateMatch | None:
+        self.logger.info(
+            "%s matches %s, which is being summarized; waiting for its notes.",
+            pdf_file,
+            leader.pdf_file,
+        )
+        leader.done.wait()
+        if leader.notes is None:
+            # The leader failed; summarize this copy on its own
+            return None
+        # No page yet: the writer links the copies to whichever is published first
+        return DuplicateMatch(
+            pdf_file=leader.pdf_file,
+            page_id=None,
+            similarity=estimate_similarity(sketch, leader.sketch),
+            notes=leader.notes,
+        )
+
+    def _record_extraction(self, pdf_file: str, extraction) -> None:
+        input_tokens = estimate_tokens(extraction.text)
+        tokens_saved = extraction.raw_chars // CHARS_PER_TOKEN + 1 - input_tokens
+        tracer.record(
+            "extract",
+            extraction.seconds,
+            pages=extraction.pages,
+            cached_pages=extraction.cached_pages,
+            bytes=len(extraction.text.encode("utf-8")),
+            input_tokens=input_tokens,
+            tokens_saved=tokens_saved,
+            backend=extraction.backend,
+        )
+        self.logger.info(
+            "Extracted %d pages from %s with %s in %.2fs (%d cached); "
+            "slowest pages: %s",
+            extraction.pages,
+            pdf_file,
+            extraction.backend,
+            extraction.seconds,
+            extraction.cached_pages,
+            extraction.slowest_pages,
+        )
+        if self.preprocess:
+            self.logger.info(
+                "Preprocessing removed %d lines and ~%d tokens (%.1f%%) from %s",
+                extraction.removed_lines,
+                tokens_saved,
+                100 * tokens_saved / max(1, input_tokens + tokens_saved),
+                pdf_file,
+            )
+
+    def _publish(
+        self,
+        summarized: queue.Queue,
+        total: int,
+        results: list[DocumentResult | None],
+    ) -> None:
+        pending = {}
+        next_index = 0
+        while next_index < total:
+            index, *item = summarized.get()
+            pending[index] = item
+            # Reorder buffer: pages are created strictly in input order
+            while next_index in pending:
+                item = pending.pop(next_index)
+                try:
+                    results[next_index] = self._publish_one(*item)
+                except Exception as e:
+                    # e.g. the PDF was deleted mid-run; the writer must keep
+                    # going or run() never returns
+                    self.logger.error(f"Error publishing {item[0]}: {e}")
+                    results[next_index] = DocumentResult(
+                        pdf_file=item[0], title=self._title(item[0]), error=str(e)
+                    )
+                if self.similarity_index is not None:
+                    self._release(item[0])
+                next_index += 1
+
+    @staticmethod
+    def _title(pdf_file: str) -> str:
+        return f"Reading Summary: {Path(pdf_file).stem}"
+
+    def _publish_one(
+        self, pdf_file: str, notes, error, sketch=None, match=None
+    ) -> DocumentResult:
+        file_name = Path(pdf_file).stem
+        title = self._title(pdf_file)
+        if error is not None:
+            stage, error = error
+            if self.dead_letters is not None:
+                self.dead_letters.record(pdf_file, stage, error)
+            return DocumentResult(pdf_file=pdf_file, title=title, error=str(error))
+        if notes is None:
+            notes = self._saved_notes(pdf_file)
+        # Near-duplicates summarized together in this run share the page of
+        # whichever copy is published first
+        group = match.pdf_file if match is not None else pdf_file
+        if match is not None and match.page_id:
+            linked = (match.pdf_file, match.page_id)
+        else:
+            linked = self._batch_pages.get(group) if sketch is not None else None
+        if linked is not None:
+            duplicate_of, page_id = linked
+            # Link to the duplicate's page instead of publishing a copy
+            if self.manifest is not None:
+                self.manifest.record(pdf_file, page_id)
+            if self.dead_letters is not None:
+                self.dead_letters.resolve(pdf_file)
+            self.similarity_index.add(pdf_file, sketch, notes, page_id)
+            if self.checkpoints is not None:
+                self.checkpoints.remove(pdf_file)
+            self.logger.info("Linked %s to the page of %s", file_name, duplicate_of)
+            return DocumentResult(
+                pdf_file=pdf_file,
+                title=title,
+                page_id=page_id,
+                duplicate_of=duplicate_of,
+            )
+        # Set when the page was created before an interrupted run recorded it
+        page_id = self.checkpoints.page_id(pdf_file) if self.checkpoints else None
+        try:
+            if page_id is None:
+                page_id = self._write_page(pdf_file, title, notes)
+                if self.checkpoints is not None:
+                    self.checkpoints.put_page_id(pdf_file, page_id)
+            if self.manifest is not None:
+                self.manifest.record(pdf_file, page_id)
+            if self.similarity_index is not None and sketch is not None:
+                self.similarity_index.add(pdf_file, sketch, notes, page_id)
+                self._batch_pages.setdefault(group, (pdf_file, page_id))
+            if self.dead_letters is not None:
+                self.dead_letters.resolve(pdf_file)
+            if self.checkpoints is not None:
+                self.checkpoints.remove(pdf_file)
+            self.logger.info("Published Notion page for %s", file_name)
+            return DocumentResult(pdf_file=pdf_file, title=title, page_id=page_id)
+        except Exception as e:
+            self.logger.error(f"Error publishing {pdf_file}: {e}")
+            if self.dead_letters is not None:
+                self.dead_letters.record(
+                    pdf_file, "notion", e, notes.model_dump() if notes else None
+                )
+            return DocumentResult(pdf_file=pdf_file, title=title, error=str(e))
+
+    def _write_page(self, pdf_file: str, title: str, notes: ReadingNotes) -> str:
+        page = dict(
+            title=title,
+            subject_id=self.subject_id,
+            assignment_id=self.assignment_id,
+            key_points=notes.key_points,
+            notes=notes.notes,
+            summary=notes.summary,
+        )
+        with tracer.span(
+            "notion",
+            document=pdf_file,
+            key_points=len(notes.key_points),
+            chars=len(notes.notes) + len(notes.summary),
+        ) as span:
+            page_id = self.manifest.page_id(pdf_file) if self.manifest else None
+            if self.upsert or (self.refresh and page_id):
+                result = self.notion_client.upsert_reading_page(**page, page_id=page_id)
+            else:
+                result = self.notion_client.create_reading_page(**page)
+            span["operations"] = result.get("operations")
+        return result["page_id"]
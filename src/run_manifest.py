@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+
+from pydantic import BaseModel
+from logger_utils import setup_logger
+
+# Bump whenever a change to extraction, prompting or page layout should cause
+# previously published readings to be processed again.
+PIPELINE_VERSION = "1"
+
+
+class ManifestEntry(BaseModel):
+    size: int
+    mtime_ns: int
+    content_hash: str
+    page_id: str
+    pipeline_version: str
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    Records which PDFs have already been published to Notion.
+
+    A file is skipped when its size and mtime match the recorded entry, which
+    only needs a stat() call. If the stat changed but the content hash did not
+    (e.g. the file was copied or touched), the entry is refreshed and the file
+    is still skipped.
+    """
+
+    def __init__(
+        self, path: str = "cache/run_manifest.json", log_level_str: str = "WARNING"
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.path = path
+        self.entries: dict[str, ManifestEntry] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                self.entries = {
+                    key: ManifestEntry.model_validate(value)
+                    for key, value in raw.items()
+                }
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable run manifest {path}: {e}")
+
+    @staticmethod
+    def _key(pdf_file: str) -> str:
+        return os.path.normcase(os.path.abspath(pdf_file))
+
+    def is_unchanged(self, pdf_file: str) -> bool:
+        entry = self.entries.get(self._key(pdf_file))
+        if entry is None or entry.pipeline_version != PIPELINE_VERSION:
+            return False
+        stat = os.stat(pdf_file)
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            return True
+        if stat.st_size != entry.size or hash_file(pdf_file) != entry.content_hash:
+            return False
+        entry.mtime_ns = stat.st_mtime_ns
+        self.save()
+        return True
+
+    def record(
+        self, pdf_file: str, page_id: str, content_hash: str | None = None
+    ) -> None:
+        stat = os.stat(pdf_file)
+        self.entries[self._key(pdf_file)] = ManifestEntry(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            content_hash=content_hash or hash_file(pdf_file),
+            page_id=page_id,
+            pipeline_version=PIPELINE_VERSION,
+        )
+        self.save()
+
+    def page_id(self, pdf_file: str) -> str | None:
+        entry = self.entries.get(self._key(pdf_file))
+        return entry.page_id if entry else None
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {key: entry.model_dump() for key, entry in self.entries.items()},
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,73 @@
+from functools import lru_cache
+from typing import Literal
+
+import yaml
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ModelRoute(BaseModel):
+    """One entry of `model_routes`: a model for inputs up to a token estimate."""
+
+    model: str
+    max_tokens: int = Field(4000, gt=0)
+    # Estimated input tokens this route accepts; None means no limit
+    max_input_tokens: int | None = Field(None, gt=0)
+
+
+class Settings(BaseModel):
+    """Typed view of config.yaml, parsed once and shared by every component."""
+
+    model_config = ConfigDict(extra="ignore", protected_namespaces=())
+
+    reading_folder: str = "readings"
+    max_tokens: int = Field(4000, gt=0)
+    model: str = "gemini/gemini-2.5-pro"
+    # Empty means every document goes to `model` with `max_tokens`
+    model_routes: list[ModelRoute] = []
+    fallback_models: list[str] = []
+    llm_timeout_seconds: float = Field(300, gt=0)
+    # Written by benchmarks/optimize_program.py; the default program is used
+    # when the file does not exist
+    compiled_program_path: str | None = "programs/process_document.json"
+    subject_id: str | None = None
+    assignments_id: str | None = None
+    reading_template_id: str | None = None
+
+    cache_dir: str = "cache"
+    cache_max_mb: float = Field(512, gt=0)
+    cache_max_age_days: float = Field(90, gt=0)
+    manifest_path: str = "cache/run_manifest.json"
+
+    extract_workers: int = Field(4, ge=1)
+    extraction_backend: Literal["auto", "pypdf", "pymupdf", "pdfium"] = "pypdf"
+    llm_concurrency: int = Field(4, ge=1)
+    notion_requests_per_second: float = Field(3, gt=0)
+    pipeline_queue_size: int = Field(8, ge=1)
+
+    max_chunk_tokens: int = Field(30000, gt=0)
+    chunk_concurrency: int = Field(8, ge=1)
+
+    upsert: bool = False
+    checkpoint_path: str = "cache/checkpoints.sqlite"
+    dead_letter_path: str = "cache/dead_letters.json"
+    retry_base_seconds: float = Field(30, gt=0)
+    retry_max_seconds: float = Field(3600, gt=0)
+    retry_max_attempts: int = Field(5, ge=1)
+    retry_wait_in_run_seconds: float = Field(120, ge=0)
+    preprocess_text: bool = True
+    detect_duplicates: bool = True
+    duplicate_threshold: float = Field(0.9, gt=0, le=1)
+    watch_debounce_seconds: float = Field(2.0, ge=0)
+    watch_poll_seconds: float = Field(1.0, gt=0)
+    metrics_dir: str = "logging/metrics"
+
+
+@lru_cache(maxsize=None)
+def load_settings(path: str = "config.yaml") -> Settings:
+    """
+    Parses and validates config.yaml. Cached, so repeated calls (from main,
+    GeminiProcessor and NotionClient) share one object. Raises
+    FileNotFoundError, yaml.YAMLError or pydantic.ValidationError.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return Settings.model_validate(yaml.safe_load(f) or {})
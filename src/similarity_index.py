@@ -0,0 +1,173 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from pydantic import BaseModel
+from logger_utils import setup_logger
+from dspy_modules import ReadingNotes
+
+SHINGLE_WORDS = 5
+SKETCH_SIZE = 128
+
+_WORD = re.compile(r"\w+")
+
+
+class DuplicateMatch(BaseModel):
+    pdf_file: str
+    page_id: str | None
+    similarity: float
+    notes: ReadingNotes
+
+
+def _shingle_hash(shingle: str) -> int:
+    # 63 bits so the value fits a signed SQLite INTEGER
+    digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def minhash_sketch(text: str, size: int = SKETCH_SIZE) -> list[int]:
+    """
+    Bottom-k MinHash sketch: the `size` smallest hashes of the document's
+    5-word shingles. One hash function is enough with bottom-k, so a
+    thousand-page book is sketched in a single pass.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {
+            " ".join(words[index : index + SHINGLE_WORDS])
+            for index in range(len(words) - SHINGLE_WORDS + 1)
+        }
+    return sorted(heapq.nsmallest(size, {_shingle_hash(s) for s in shingles}))
+
+
+def estimate_similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two sketches."""
+    if not a or not b:
+        return 0.0
+    size = min(len(a), len(b))
+    union = heapq.nsmallest(size, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(value in both for value in union) / len(union)
+
+
+class SimilarityIndex:
+    """
+    Persistent near-duplicate index over published readings.
+
+    Each entry stores a MinHash sketch of the extracted text together with
+    the ReadingNotes and Notion page it produced. Candidates are looked up
+    through an inverted index on sketch values, then scored with the full
+    sketch; a score of at least `threshold` counts as a duplicate. Entries
+    recorded for the same file path are ignored, so an edited reading is
+    summarized again rather than matched against its previous version.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "cache",
+        threshold: float = 0.9,
+        log_level_str: str = "WARNING",
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(cache_dir, "similarity_index.sqlite"),
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                pdf_file TEXT PRIMARY KEY,
+                sketch TEXT NOT NULL,
+                notes TEXT NOT NULL,
+                page_id TEXT,
+                created_at REAL NOT NULL
+            )
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sketch_values (
+                value INTEGER NOT NULL,
+                pdf_file TEXT NOT NULL
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS sketch_values_value ON sketch_values (value)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _key(pdf_file: str) -> str:
+        return os.path.abspath(pdf_file)
+
+    def find(self, sketch: list[int], pdf_file: str) -> DuplicateMatch | None:
+        """Returns the most similar other reading above the threshold, if any."""
+        if not sketch:
+            return None
+        # Two sketches with Jaccard >= threshold share roughly that share of
+        # their values; require a third of it to keep candidate lists short
+        min_shared = max(1, int(len(sketch) * self.threshold / 3))
+        placeholders = ",".join("?" * len(sketch))
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT d.pdf_file, d.sketch, d.notes, d.page_id "
+                "FROM documents d JOIN ("
+                "  SELECT pdf_file, COUNT(*) AS shared FROM sketch_values "
+                f"  WHERE value IN ({placeholders}) GROUP BY pdf_file"
+                ") c ON c.pdf_file = d.pdf_file "
+                "WHERE c.shared >= ? AND d.pdf_file != ?",
+                (*sketch, min_shared, self._key(pdf_file)),
+            ).fetchall()
+        best = None
+        for other_file, other_sketch, notes, page_id in rows:
+            similarity = estimate_similarity(sketch, json.loads(other_sketch))
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, other_file, notes, page_id)
+        if best is None:
+            return None
+        similarity, other_file, notes, page_id = best
+        return DuplicateMatch(
+            pdf_file=other_file,
+            page_id=page_id,
+            similarity=similarity,
+            notes=ReadingNotes.model_validate_json(notes),
+        )
+
+    def add(
+        self,
+        pdf_file: str,
+        sketch: list[int],
+        notes: ReadingNotes,
+        page_id: str | None,
+    ) -> None:
+        key = self._key(pdf_file)
+        with self.lock:
+            self.conn.execute("DELETE FROM sketch_values WHERE pdf_file = ?", (key,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(pdf_file, sketch, notes, page_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(sketch),
+                    notes.model_dump_json(),
+                    page_id,
+                    time.time(),
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO sketch_values (value, pdf_file) VALUES (?, ?)",
+                [(value, key) for value in set(sketch)],
+            )
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
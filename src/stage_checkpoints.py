@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from logger_utils import setup_logger
+from dspy_modules import ReadingNotes
+from pdf_extraction import ExtractionReport, extract_pdf_text
+
+# Stages in pipeline order; a checkpoint records the last one completed
+EXTRACT = "extract"
+LLM = "llm"
+NOTION = "notion"
+
+
+class CheckpointStore:
+    """
+    Per-document stage checkpoints, so a run that dies part-way resumes each
+    document at its first incomplete stage.
+
+    A row holds the extracted text (zlib-compressed) with its extraction
+    metadata, then the ReadingNotes as JSON, then the Notion page ID. Rows
+    are tied to the file's size and mtime and to the extraction settings;
+    a row that no longer matches is dropped. A document's row is removed
+    once it has been recorded in the run manifest. The pipeline passes only
+    file names between stages and each stage reads its input from here, so
+    memory does not grow with the number of queued documents.
+    """
+
+    def __init__(
+        self, path: str = "cache/checkpoints.sqlite", log_level_str: str = "WARNING"
+    ):
+        self.logger = setup_logger(__name__, log_level_str)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # Extraction worker processes write here too
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                pdf_file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                extract_config TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                report TEXT NOT NULL,
+                text BLOB NOT NULL,
+                notes TEXT,
+                page_id TEXT,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self.conn.commit()
+
+    @staticmethod
+    def _key(pdf_file: str) -> str:
+        return os.path.normcase(os.path.abspath(pdf_file))
+
+    def completed_stage(self, pdf_file: str, extract_config: str) -> str | None:
+        """
+        The last stage completed for the file, or None. A checkpoint made
+        for another version of the file or other extraction settings is
+        dropped.
+        """
+        key = self._key(pdf_file)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, extract_config, stage FROM checkpoints "
+                "WHERE pdf_file = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            size, mtime_ns, config, stage = row
+            try:
+                stat = os.stat(pdf_file)
+                current = (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns)
+            except OSError:
+                current = False
+            if current and config == extract_config:
+                return stage
+            self.conn.execute("DELETE FROM checkpoints WHERE pdf_file = ?", (key,))
+            self.conn.commit()
+        self.logger.info("Dropping stale checkpoint for %s", pdf_file)
+        return None
+
+    def put_extraction(
+        self, pdf_file: str, report: ExtractionReport, extract_config: str
+    ) -> None:
+        stat = os.stat(pdf_file)
+        text = zlib.compress(report.text.encode("utf-8"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(pdf_file, size, mtime_ns, extract_config, stage, report, text, "
+                "notes, page_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, NULL, ?)",
+                (
+                    self._key(pdf_file),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    extract_config,
+                    EXTRACT,
+                    report.model_dump_json(exclude={"text"}),
+                    text,
+                    time.time(),
+                ),
+            )
+            self.conn.commit()
+
+    def extraction(self, pdf_file: str) -> ExtractionReport | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT report, text FROM checkpoints WHERE pdf_file = ?",
+                (self._key(pdf_file),),
+            ).fetchone()
+        if row is None:
+            return None
+        report, text = row
+        return ExtractionReport.model_validate(
+            {**json.loads(report), "text": zlib.decompress(text).decode("utf-8")}
+        )
+
+    def put_notes(self, pdf_file: str, notes: ReadingNotes) -> None:
+        self._advance(pdf_file, LLM, "notes", notes.model_dump_json())
+
+    def notes(self, pdf_file: str) -> ReadingNotes | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT notes FROM checkpoints WHERE pdf_file = ?",
+                (self._key(pdf_file),),
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return ReadingNotes.model_validate_json(row[0])
+
+    def put_page_id(self, pdf_file: str, page_id: str) -> None:
+        self._advance(pdf_file, NOTION, "page_id", page_id)
+
+    def page_id(self, pdf_file: str) -> str | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_id FROM checkpoints WHERE pdf_file = ?",
+                (self._key(pdf_file),),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _advance(self, pdf_file: str, stage: str, column: str, value: str) -> None:
+        # The compressed text is only needed until the notes exist
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE checkpoints SET stage = ?, {column} = ?, text = x'', "
+                "updated_at = ? WHERE pdf_file = ?",
+                (stage, value, time.time(), self._key(pdf_file)),
+            )
+            self.conn.commit()
+
+    def remove(self, pdf_file: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM checkpoints WHERE pdf_file = ?", (self._key(pdf_file),)
+            )
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def extract_to_checkpoint(
+    pdf_file: str,
+    checkpoint_path: str,
+    extract_config: str,
+    cache_dir: str | None = "cache",
+    preprocess: bool = False,
+    backend: str = "pypdf",
+) -> ExtractionReport:
+    """
+    Runs extract_pdf_text in a worker process and stores the text in the
+    checkpoint store instead of sending it back; the returned report has an
+    empty `text`.
+    """
+    report = extract_pdf_text(
+        pdf_file, cache_dir, preprocess=preprocess, backend=backend
+    )
+    store = CheckpointStore(checkpoint_path)
+    try:
+        store.put_extraction(pdf_file, report, extract_config)
+    finally:
+        store.close()
+    return report.model_copy(update={"text": ""})
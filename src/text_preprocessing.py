@@ -0,0 +1,97 @@
+import re
+from collections import Counter
+
+from pydantic import BaseModel
+
+# Running headers and footers live in the first / last few lines of a page
+EDGE_LINES = 3
+# A line is boilerplate when it shows up on this share of pages (and on at
+# least MIN_REPEATS pages); 0.3 also catches headers that alternate between
+# even and odd pages.
+MIN_REPEAT_RATIO = 0.3
+MIN_REPEATS = 3
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(?=[a-z])")
+# "12", "Page 12", "12 of 300", "12 / 300" and front-matter numerals "xiv"
+_PAGE_NUMBER = re.compile(
+    r"^(page\s+)?(\d+|[ivx]{1,6})(\s*(of|/)\s*\d+)?$", re.IGNORECASE
+)
+
+
+class PreprocessedText(BaseModel):
+    text: str
+    page_offsets: list[int]
+    raw_chars: int
+    removed_lines: int
+
+
+def _line_key(line: str) -> str:
+    # Digits are masked so "Chapter 3 - 41" and "Chapter 3 - 42" match
+    return _DIGITS.sub("#", _SPACES.sub(" ", line).strip().lower())
+
+
+def _edge_indexes(lines: list[str]) -> list[int]:
+    content = [index for index, line in enumerate(lines) if line.strip()]
+    return sorted(set(content[:EDGE_LINES] + content[-EDGE_LINES:]))
+
+
+def boilerplate_lines(pages: list[str]) -> set[str]:
+    """Normalized header/footer lines that repeat across pages."""
+    counts = Counter()
+    for page in pages:
+        lines = page.splitlines()
+        counts.update({_line_key(lines[index]) for index in _edge_indexes(lines)})
+    threshold = max(MIN_REPEATS, MIN_REPEAT_RATIO * len(pages))
+    return {key for key, count in counts.items() if key and count >= threshold}
+
+
+def _clean_page(page: str, boilerplate: set[str]) -> tuple[str, int]:
+    lines = page.splitlines()
+    drop = set()
+    for index in _edge_indexes(lines):
+        stripped = lines[index].strip()
+        if _line_key(stripped) in boilerplate or _PAGE_NUMBER.match(stripped):
+            drop.add(index)
+    kept = [
+        _SPACES.sub(" ", line).strip()
+        for index, line in enumerate(lines)
+        if index not in drop
+    ]
+    text = _HYPHEN_BREAK.sub(r"\1", "\n".join(kept))
+    return _BLANK_LINES.sub("\n\n", text).strip("\n"), len(drop)
+
+
+def preprocess_pages(pages: list[str]) -> PreprocessedText:
+    """
+    Removes layout noise from extracted page text before it is sent to the
+    LLM: running headers/footers (by cross-page line frequency), bare page
+    numbers, words hyphenated across line and page breaks, and redundant
+    whitespace. Page offsets are recomputed for the cleaned text.
+    """
+    boilerplate = boilerplate_lines(pages) if len(pages) >= MIN_REPEATS else set()
+    parts = []
+    page_offsets = []
+    offset = 0
+    removed_lines = 0
+    for page in pages:
+        text, removed = _clean_page(page, boilerplate)
+        removed_lines += removed
+        separator = "\n" if parts else ""
+        # A word split across the page break: "exam-" + "ple"
+        if parts and re.search(r"\w-$", parts[-1]) and text[:1].islower():
+            parts[-1] = parts[-1][:-1]
+            offset -= 1
+            separator = ""
+        offset += len(separator)
+        page_offsets.append(offset)
+        parts.append(separator + text if separator else text)
+        offset += len(text)
+    return PreprocessedText(
+        text="".join(parts),
+        page_offsets=page_offsets,
+        raw_chars=sum(len(page) for page in pages),
+        removed_lines=removed_lines,
+    )